@@ -0,0 +1,545 @@
+"""
+Benchmarks dos caminhos críticos do bot.
+
+Mede, sem rede (exchange e Telegram falsos):
+- indicadores: pandas (referência) vs `TradingBot.get_indicators` vs `IndicatorState` (incremental, por vela)
+- decodificação de mensagens no `BinanceWebSocket` (mensagens/s)
+- lógica de decisão de `trade()` por tick
+- latência tick -> ordem (do `trade()` até o `create_order` da ordem de mercado)
+- cálculo de PnL em `check_position` e `send_daily_pnl`
+- crescimento de memória numa sessão simulada (24h por padrão)
+- scanner de mercado: passada vetorizada sobre 500 pares e mensagens de kline/s
+- custo de registrar um evento no log (no caminho de trading)
+- modo sombra: avaliação de K variantes por vela fechada (backtest), por update de kline (ao vivo) e saídas por tick (K = 6 e 64)
+
+Os resultados são salvos em JSON. Com `--baseline`, compara com uma execução anterior e
+retorna código de saída 1 se alguma métrica piorar mais que a tolerância.
+
+Uso:
+    python bench.py --quick
+    python bench.py --baseline bench_results/baseline.json
+    python bench.py --recorded data --symbol xrpusdt --start 2026-10-19T13:00 --end 2026-10-19T14:00
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+import event_log
+import scalpingv2
+from scalpingv2 import BinanceWebSocket, IndicatorState, TradingBot
+
+
+####### FIXTURES #######################################################################
+# Eventos dos bots de benchmark: gravados fora do repositório e sem saída no terminal
+BENCH_EVENT_LOG = event_log.EventLog(os.path.join(tempfile.gettempdir(), 'bench-events'), console_level=event_log.ERROR + 1)
+
+
+def synthetic_candles(n: int, start_price: float = 0.5, trend: float = 0.0, seed: int = 42) -> List[list]:
+    """Gera velas de 5m com passeio aleatório (trend < 0 força RSI baixo)"""
+    rng = random.Random(seed)
+    candles = []
+    price = start_price
+    ts = 1_700_000_000_000
+    for _ in range(n):
+        open_ = price
+        close = max(open_ * (1 + trend + rng.gauss(0, 0.002)), 0.0001)
+        high = max(open_, close) * (1 + abs(rng.gauss(0, 0.001)))
+        low = min(open_, close) * (1 - abs(rng.gauss(0, 0.001)))
+        volume = rng.uniform(60_000, 200_000)
+        candles.append([ts, open_, high, low, close, volume])
+        price = close
+        ts += 300_000
+    return candles
+
+
+def synthetic_ticker_messages(n: int, symbol: str = 'XRPUSDT', start_price: float = 0.5, seed: int = 42) -> List[str]:
+    """Gera mensagens no formato do stream <symbol>@ticker da Binance"""
+    rng = random.Random(seed)
+    messages = []
+    price = start_price
+    ts = 1_700_000_000_000
+    for i in range(n):
+        price *= 1 + rng.gauss(0, 0.0003)
+        messages.append(json.dumps({
+            "e": "24hrTicker", "E": ts + i * 1000, "s": symbol,
+            "p": "0.0012", "P": "0.240", "w": f"{price:.4f}", "x": f"{price:.4f}",
+            "c": f"{price:.4f}", "Q": "120.0", "b": f"{price * 0.9999:.4f}", "B": "5000.0",
+            "a": f"{price * 1.0001:.4f}", "A": "4200.0", "o": f"{start_price:.4f}",
+            "h": f"{price * 1.01:.4f}", "l": f"{price * 0.99:.4f}", "v": "150000000.0",
+            "q": "75000000.0", "O": ts - 86_400_000, "C": ts + i * 1000,
+            "F": 1, "L": 100000 + i, "n": 100000 + i,
+        }, separators=(',', ':')))
+    return messages
+
+
+def recorded_ticker_messages(data_dir: str, symbol: str, start: float, end: float) -> List[str]:
+    """Carrega mensagens de ticker gravadas pelo recorder.py"""
+    from recorder import MarketDataReader
+
+    table = MarketDataReader(data_dir).read(start, end, [f"{symbol.lower()}@ticker"])
+    return table.column('payload').to_pylist()
+
+
+def candles_from_messages(messages: List[str], interval_ms: int = 300_000) -> List[list]:
+    """Agrega mensagens de ticker em velas OHLCV"""
+    candles = []
+    for message in messages:
+        data = json.loads(message)
+        ts, price, qty = data['E'] // interval_ms * interval_ms, float(data['c']), float(data.get('Q', 0))
+        if candles and candles[-1][0] == ts:
+            candle = candles[-1]
+            candle[2], candle[3], candle[4], candle[5] = max(candle[2], price), min(candle[3], price), price, candle[5] + qty
+        else:
+            candles.append([ts, price, price, price, price, qty])
+    return candles
+
+
+####### STUBS ##########################################################################
+class StubExchange:
+    """Exchange falsa com a parte da interface do ccxt usada pelo bot, sem rede"""
+    def __init__(self, candles: List[list]):
+        self.candles = candles
+        self.cursor = len(candles)  # fetch_ohlcv retorna velas terminando aqui
+        self.orders: Dict[str, dict] = {}
+        self.next_id = 1
+        self.market_order_times: List[float] = []
+
+    def reset(self):
+        self.orders.clear()
+        self.market_order_times.clear()
+
+    def fetch_ohlcv(self, symbol, timeframe='5m', since=None, limit=None):
+        end = self.cursor
+        return self.candles[max(end - (limit or 500), 0):end]
+
+    def fetch_balance(self):
+        return {'USDT': {'free': 1_000_000.0}, 'XRP': {'free': 1_000_000.0}}
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        if type == 'market':
+            self.market_order_times.append(time.perf_counter())
+        fill = price or self.candles[self.cursor - 1][4]
+        order = {
+            'id': str(self.next_id), 'symbol': symbol, 'type': type, 'side': side, 'amount': amount,
+            'price': fill, 'average': fill, 'status': 'closed' if type == 'market' else 'open',
+        }
+        self.next_id += 1
+        self.orders[order['id']] = order
+        return order
+
+    def fetch_order(self, id, symbol=None):
+        return self.orders[id]
+
+    def fetch_open_orders(self, symbol=None):
+        return [o for o in self.orders.values() if o['status'] == 'open']
+
+    def fetch_closed_orders(self, symbol=None, since=None):
+        return [o for o in self.orders.values() if o['status'] == 'closed']
+
+    def cancel_order(self, id, symbol=None):
+        self.orders[id]['status'] = 'canceled'
+
+    def cancel_all_orders(self, symbol=None):
+        for order in self.fetch_open_orders(symbol):
+            order['status'] = 'canceled'
+
+    def price_to_precision(self, symbol, price):
+        return f"{price:.4f}"
+
+    def amount_to_precision(self, symbol, amount):
+        return f"{amount:.1f}"
+
+    def market_id(self, symbol):
+        return symbol.replace('/', '')
+
+    def market(self, symbol):
+        return {'limits': {'cost': {'min': 5.0}, 'amount': {'min': 0.1}}}
+
+
+class BenchBot(TradingBot):
+    """TradingBot com exchange falsa e sem Telegram"""
+    def __init__(self, exchange: StubExchange, ws: BinanceWebSocket):
+        self._stub_exchange = exchange
+        super().__init__(symbol='XRP/USDT', initial_balance=1000, websocket_client=ws, simulation_mode=False, event_log=BENCH_EVENT_LOG)
+        self.bot_running = True
+
+    def setup_exchange(self):
+        self.exchange = self._stub_exchange
+
+    def setup_telegram(self):
+        pass
+
+    def send_telegram_message(self, message):
+        pass
+
+
+def make_bot(candles: List[list]) -> BenchBot:
+    return BenchBot(StubExchange(candles), BinanceWebSocket('XRP/USDT'))
+
+
+def no_sleep():
+    """Remove o `time.sleep` do bot (ex.: a espera de 1s em place_trade) para não medir tempo parado"""
+    return mock.patch.object(scalpingv2.time, 'sleep', lambda seconds: None)
+
+
+####### BENCHMARKS #####################################################################
+def timeit(fn: Callable[[], None], iterations: int, repeat: int = 5) -> float:
+    """Retorna a mediana (em µs) do tempo por iteração"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        samples.append((time.perf_counter() - started) / iterations * 1e6)
+    return statistics.median(samples)
+
+
+def metric(value: float, unit: str, better: str = 'lower') -> dict:
+    return {'value': round(value, 3), 'unit': unit, 'better': better}
+
+
+def pandas_indicators(candles: List[list], period: int = 14) -> dict:
+    """Implementação em pandas dos indicadores (a que o bot usava antes), mantida como referência"""
+    import pandas as pd
+
+    df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    delta = df['close'].diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    df['RSI'] = 100 - (100 / (1 + gain / loss))
+    df['ATR'] = (df['high'] - df['low']).rolling(window=period).mean()
+    df['MACD'] = df['close'].ewm(span=12, adjust=False).mean() - df['close'].ewm(span=26, adjust=False).mean()
+    df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
+    return {
+        'RSI': df['RSI'].iloc[-1],
+        'ATR': df['ATR'].iloc[-1],
+        'MACD': df['MACD'].iloc[-1],
+        'Signal_Line': df['Signal_Line'].iloc[-1],
+        'volume': df['volume'].iloc[-1],
+    }
+
+
+def bench_indicators(candles: List[list], quick: bool) -> Dict[str, dict]:
+    bot = make_bot(candles)
+    window = candles[-15:]
+    pandas_us = timeit(lambda: pandas_indicators(window), 50 if quick else 500)
+    get_indicators_us = timeit(bot.get_indicators, 50 if quick else 500)
+
+    def incremental():
+        state = IndicatorState()
+        for candle in candles:
+            state.update(candle)
+
+    incremental_us = timeit(incremental, 5 if quick else 20) / len(candles)
+
+    return {
+        'indicators_pandas_us': metric(pandas_us, 'us/call'),
+        'indicators_get_indicators_us': metric(get_indicators_us, 'us/call'),
+        'indicators_incremental_us': metric(incremental_us, 'us/candle'),
+    }
+
+
+def bench_ws_decode(messages: List[str], quick: bool) -> Dict[str, dict]:
+    ws = BinanceWebSocket('XRP/USDT')
+    bot = make_bot(synthetic_candles(100))
+    ws.add_listener(bot.on_price)
+
+    def decode_all():
+        for message in messages:
+            ws.on_message(message)
+
+    per_message_us = timeit(decode_all, 1, repeat=3 if quick else 10) / len(messages)
+    return {'ws_messages_per_sec': metric(1e6 / per_message_us, 'msg/s', better='higher')}
+
+
+def bench_trade_decision(candles: List[list], quick: bool) -> Dict[str, dict]:
+    bot = make_bot(candles)
+    price = candles[-1][4]
+    with no_sleep(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        decision_us = timeit(lambda: bot.trade(price), 50 if quick else 500)
+    return {'trade_decision_us': metric(decision_us, 'us/tick')}
+
+
+def bench_scanner(quick: bool, symbols: int = 500) -> Dict[str, dict]:
+    from scanner import MarketScanner
+
+    names = [f"PAR{i}/USDT" for i in range(symbols)]
+    scanner = MarketScanner(names, '5m', min_bar_quote_volume=0, min_24h_quote_volume=0)
+    for i, name in enumerate(names):
+        for candle in synthetic_candles(scanner.bars.shape[2], seed=i):
+            scanner.write_candle(i, *candle[:1], *candle[2:])
+
+    open_time = scanner.bar_ts + scanner.timeframe_ms
+    messages = [
+        json.dumps({'stream': f"par{i % symbols}usdt@kline_5m", 'data': {
+            'e': 'kline', 's': f"PAR{i % symbols}USDT",
+            'k': {'t': open_time, 'h': '0.51', 'l': '0.49', 'c': '0.5', 'v': '1000'},
+        }})
+        for i in range(10_000 if quick else 100_000)
+    ]
+
+    def decode_all():
+        for message in messages:
+            scanner.on_message(message)
+
+    scan_us = timeit(scanner.scan, 20 if quick else 200)
+    per_message_us = timeit(decode_all, 1, repeat=3 if quick else 10) / len(messages)
+    return {
+        f'scanner_scan_{symbols}_symbols_us': metric(scan_us, 'us/scan'),
+        'scanner_messages_per_sec': metric(1e6 / per_message_us, 'msg/s', better='higher'),
+    }
+
+
+def bench_event_log(quick: bool) -> Dict[str, dict]:
+    log = event_log.EventLog(os.path.join(tempfile.gettempdir(), 'bench-events'), console_level=event_log.ERROR + 1)
+    filtered = event_log.EventLog(level=event_log.INFO, console_level=event_log.INFO, tick_level=event_log.DEBUG)
+    iterations = 10_000 if quick else 100_000
+
+    def emit_orders():
+        for _ in range(iterations):
+            log.order('XRP/USDT', 'buy', type='market', amount=10.0, price=0.5)
+
+    def emit_filtered_ticks():
+        for _ in range(iterations):
+            filtered.tick('XRP/USDT', 0.5, rsi=45.0, volume=1e5, macd=0.0, signal_line=0.0, atr=0.001)
+
+    results = {
+        'event_log_emit_us': metric(timeit(emit_orders, 1, repeat=3) / iterations, 'us/event'),
+        'event_log_filtered_us': metric(timeit(emit_filtered_ticks, 1, repeat=3) / iterations, 'us/event'),
+    }
+    log.stop()
+    filtered.stop()
+    return results
+
+
+def bench_shadow(candles: List[list], quick: bool) -> Dict[str, dict]:
+    from shadow import DEFAULT_VARIANTS, ShadowBook, Variant
+
+    state = IndicatorState()
+    bars = [(candle, dict(state.update(candle))) for candle in candles]
+    bars = [(candle, indicators) for candle, indicators in bars if indicators['RSI'] is not None]
+
+    results = {}
+    for variants in (DEFAULT_VARIANTS, [Variant(f"rsi_{i}", rsi_buy=20 + i % 15, rsi_sell=65 + i % 15) for i in range(64)]):
+        book = ShadowBook(variants, 1000, 0.02)
+
+        def evaluate_all():
+            for candle, indicators in bars:
+                book.on_bar(candle, indicators)
+
+        def exits_all():
+            for candle, _ in bars:
+                book.on_tick(candle[4])
+
+        # Ao vivo (TradingBot.on_candle): indicadores da janela de 15 velas + entradas, a cada update de kline
+        def kline_updates():
+            for i in range(15, len(candles)):
+                book.on_indicators(candles[i][4], IndicatorState.from_candles(candles[i - 14:i + 1]).values())
+
+        per_bar_us = timeit(evaluate_all, 1, repeat=3 if quick else 10) / len(bars)
+        per_tick_us = timeit(exits_all, 1, repeat=3 if quick else 10) / len(bars)
+        per_update_us = timeit(kline_updates, 1, repeat=3 if quick else 10) / (len(candles) - 15)
+        results[f'shadow_{len(variants)}_variants_us'] = metric(per_bar_us, 'us/bar')
+        results[f'shadow_{len(variants)}_tick_exits_us'] = metric(per_tick_us, 'us/tick')
+        results[f'shadow_{len(variants)}_kline_update_us'] = metric(per_update_us, 'us/update')
+    return results
+
+
+def bench_tick_to_order(quick: bool) -> Dict[str, dict]:
+    # Velas em queda com volume alto -> RSI < 30 e sinal de compra em todo tick
+    candles = synthetic_candles(200, trend=-0.004)
+    bot = make_bot(candles)
+    price = candles[-1][4]
+    bot.ws.price = price
+    latencies = []
+
+    with no_sleep(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(50 if quick else 500):
+            bot.exchange.reset()
+            bot.active_position = None
+            started = time.perf_counter()
+            bot.trade(price)
+            if bot.exchange.market_order_times:
+                latencies.append((bot.exchange.market_order_times[0] - started) * 1e6)
+
+    if not latencies:
+        return {}
+
+    latencies.sort()
+    return {
+        'tick_to_order_p50_us': metric(latencies[len(latencies) // 2], 'us'),
+        'tick_to_order_p99_us': metric(latencies[int(len(latencies) * 0.99)], 'us'),
+    }
+
+
+def bench_pnl(candles: List[list], quick: bool) -> Dict[str, dict]:
+    bot = make_bot(candles)
+    exchange = bot.exchange
+    bot.ws.price = candles[-1][4]
+
+    def close_position():
+        exchange.reset()
+        tp = exchange.create_order('XRP/USDT', 'TAKE_PROFIT_LIMIT', 'sell', 5, 0.51)
+        sl = exchange.create_order('XRP/USDT', 'STOP_LOSS_LIMIT', 'sell', 5, 0.49)
+        tp['status'] = 'closed'
+        bot.active_position = {
+            'side': 'buy', 'entry_price': 0.5, 'order_id': '0', 'trade_size': 5,
+            'tp_order_id': tp['id'], 'sl_order_id': sl['id'],
+        }
+        bot.daily_pnl = 0
+        bot.check_position()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        check_position_us = timeit(close_position, 100 if quick else 2000)
+
+    # 500 pares compra/venda fechados nas últimas 24h
+    exchange.reset()
+    for i in range(500):
+        exchange.create_order('XRP/USDT', 'market', 'sell', 5, 0.51 + i * 1e-5)
+        exchange.create_order('XRP/USDT', 'market', 'buy', 5, 0.50 + i * 1e-5)
+    daily_pnl_us = timeit(bot.send_daily_pnl, 10 if quick else 100)
+
+    return {
+        'check_position_pnl_us': metric(check_position_us, 'us/call'),
+        'send_daily_pnl_1000_orders_us': metric(daily_pnl_us, 'us/call'),
+    }
+
+
+def bench_memory_session(messages: List[str], hours: float) -> Dict[str, dict]:
+    """Simula uma sessão com 1 tick/s: decodifica a mensagem e chama trade(), como o loop principal"""
+    candles = synthetic_candles(int(hours * 12) + 100)
+    bot = make_bot(candles)
+    ws = bot.ws
+    exchange = bot.exchange
+    exchange.cursor = 100
+
+    ticks = int(hours * 3600)
+    hourly = []
+    tracemalloc.start()
+    try:
+        with no_sleep(), open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for tick in range(ticks):
+                ws.on_message(messages[tick % len(messages)])
+                bot.trade(ws.get_price())
+                if tick % 300 == 299:
+                    exchange.cursor = min(exchange.cursor + 1, len(candles))
+                if tick % 3600 == 0:
+                    hourly.append(tracemalloc.get_traced_memory()[0])
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'session_memory_growth_kb': metric((current - hourly[0]) / 1024, 'KiB'),
+        'session_memory_peak_kb': metric(peak / 1024, 'KiB'),
+    }
+
+
+####### RESULTADOS #####################################################################
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Retorna a lista de métricas que pioraram mais que a tolerância"""
+    regressions = []
+    for name, current in results['metrics'].items():
+        previous = baseline.get('metrics', {}).get(name)
+        if not previous or not previous['value']:
+            continue
+
+        change = (current['value'] - previous['value']) / previous['value']
+        worse = change > tolerance if current['better'] == 'lower' else change < -tolerance
+        flag = '❌' if worse else '✅'
+        print(f"{flag} {name}: {previous['value']} -> {current['value']} {current['unit']} ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do bot de trading")
+    parser.add_argument('--quick', action='store_true', help="Menos iterações e sessão de 1h")
+    parser.add_argument('--hours', type=float, default=None, help="Duração da sessão simulada (padrão 24h, 1h com --quick)")
+    parser.add_argument('--recorded', default=None, help="Diretório gravado pelo recorder.py")
+    parser.add_argument('--symbol', default='xrpusdt')
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=None)
+    parser.add_argument('--out', default='bench_results')
+    parser.add_argument('--baseline', default=None, help="JSON de uma execução anterior para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Piora máxima aceita (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.recorded:
+        from recorder import parse_time
+
+        messages = recorded_ticker_messages(args.recorded, args.symbol, parse_time(args.start), parse_time(args.end))
+        if not messages:
+            sys.exit("Nenhuma mensagem gravada no intervalo informado")
+        candles = candles_from_messages(messages)
+        fixture = 'recorded'
+    else:
+        messages = synthetic_ticker_messages(10_000 if args.quick else 100_000)
+        candles = synthetic_candles(500)
+        fixture = 'synthetic'
+
+    hours = args.hours if args.hours is not None else (1 if args.quick else 24)
+
+    metrics = {}
+    for name, run in [
+        ('indicadores', lambda: bench_indicators(candles, args.quick)),
+        ('websocket', lambda: bench_ws_decode(messages, args.quick)),
+        ('decisão', lambda: bench_trade_decision(candles, args.quick)),
+        ('tick -> ordem', lambda: bench_tick_to_order(args.quick)),
+        ('pnl', lambda: bench_pnl(candles, args.quick)),
+        ('scanner', lambda: bench_scanner(args.quick)),
+        ('log de eventos', lambda: bench_event_log(args.quick)),
+        ('modo sombra', lambda: bench_shadow(candles, args.quick)),
+        (f'sessão {hours:g}h', lambda: bench_memory_session(messages, hours)),
+    ]:
+        print(f"⏱️ {name}...")
+        for metric_name, value in run().items():
+            metrics[metric_name] = value
+            print(f"   {metric_name}: {value['value']} {value['unit']}")
+
+    results = {
+        'timestamp': int(time.time()),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'fixture': fixture,
+        'quick': args.quick,
+        'metrics': metrics,
+    }
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench-{results['timestamp']}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Resultados salvos em {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"🚨 Regressão de desempenho em: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+"""
+Modo cluster: um coordenador distribui os símbolos entre workers (processos ou máquinas diferentes).
+
+- Protocolo: TCP com uma mensagem JSON por linha (NDJSON).
+- Worker -> coordenador: `hello` ao conectar e `report` a cada HEARTBEAT_INTERVAL (PnL, exposição, posições).
+- Coordenador -> worker: `config` (parâmetros dos bots), `assign` (lista de símbolos e parte da banca),
+  `halt` (limite global atingido) e `resume` (novo dia).
+- Cada worker tem seus próprios WebSockets, cliente da exchange (e IP, com o próprio limite de peso da Binance)
+  e um RiskEngine compartilhado pelos seus bots.
+- O coordenador soma o PnL de todos os workers e aplica `max_drawdown` / `daily_profit_target` na conta inteira.
+- O `report` lista os símbolos que o worker ainda roda. Um símbolo só é enviado ao novo dono depois que o
+  dono anterior deixa de listá-lo (o worker manda um report logo após processar cada `assign`), para que um
+  símbolo nunca tenha dois donos.
+- Um bot só é parado (símbolo entregue a outro worker ou conexão com o coordenador perdida) depois de terminar
+  o trade() ou o fechamento em andamento e de fechar a posição aberta a mercado.
+- Worker sem report por HEARTBEAT_TIMEOUT (ou com a conexão fechada) é considerado morto. Sem a conexão, ele
+  mesmo para os seus bots; os símbolos dele só vão para os workers restantes quando ele voltar sem eles ou
+  depois de LEASE_TIMEOUT. Se o processo morreu, as posições abertas ficam protegidas só pelas ordens de TP/SL
+  na exchange, e o novo dono do símbolo não abre outra enquanto houver ordens abertas.
+
+Uso (vários workers na mesma máquina):
+    python cluster.py coordinator --symbols XRP/USDT,ADA/USDT,DOGE/USDT,SOL/USDT --port 8765 --simulation
+    python cluster.py worker --coordinator 127.0.0.1:8765 --name w1
+    python cluster.py worker --coordinator 127.0.0.1:8765 --name w2
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from event_log import WARNING, get_event_log
+
+HEARTBEAT_INTERVAL = 1.0    # Intervalo (s) entre os reports dos workers
+HEARTBEAT_TIMEOUT = 5.0     # Sem report por esse tempo (s), o worker é considerado morto
+LEASE_TIMEOUT = 60.0        # Tempo (s) desde o último report até os símbolos de um worker morto serem liberados
+RECONNECT_DELAY = 5.0       # Espera (s) do worker antes de reconectar ao coordenador
+
+
+async def send(writer: asyncio.StreamWriter, message: dict) -> None:
+    writer.write((json.dumps(message) + '\n').encode())
+    await writer.drain()
+
+
+####### COORDENADOR ####################################################################
+class WorkerNode:
+    """Estado de um worker conectado, do ponto de vista do coordenador"""
+    def __init__(self, name: str, writer: asyncio.StreamWriter):
+        self.name = name
+        self.writer = writer
+        self.symbols: Set[str] = set()          # Símbolos que o coordenador quer neste worker
+        self.sent: Optional[Set[str]] = None    # Última atribuição enviada
+        self.last_seen = time.monotonic()
+        self.report: dict = {}
+
+
+class Coordinator:
+    def __init__(self, symbols: List[str], bot_config: dict, host: str = '0.0.0.0', port: int = 8765,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT, lease_timeout: float = LEASE_TIMEOUT):
+        from scalpingv2 import RiskEngine
+
+        self.symbols = list(symbols)
+        self.bot_config = bot_config
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.lease_timeout = lease_timeout
+        self.log = get_event_log()
+
+        self.workers: Dict[str, WorkerNode] = {}
+        self.held: Dict[str, str] = {}          # symbol -> worker que ainda roda o bot (segundo os reports)
+        self.leases: Dict[str, float] = {}      # Worker removido -> instante (monotonic) em que os símbolos dele são liberados
+        self.retired_pnl = 0.0  # PnL realizado no dia por workers que já saíram
+        self.retired_by_worker: Dict[str, float] = {}   # Parte do retired_pnl de cada worker (devolvida se ele voltar)
+
+        # Limites da conta inteira, aplicados sobre a soma dos workers
+        self.risk = RiskEngine(
+            bot_config['initial_balance'], bot_config['risk_per_trade'], bot_config['max_drawdown'], bot_config['daily_profit_target']
+        )
+
+    async def run(self) -> None:
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.log.info(f"🧭 Coordenador ouvindo em {self.host}:{self.port} ({len(self.symbols)} símbolos)")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.monitor())
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        node = None
+        try:
+            hello = json.loads(await asyncio.wait_for(reader.readline(), self.heartbeat_timeout))
+            if hello.get('type') != 'hello':
+                raise ValueError(f"mensagem inicial inválida: {hello}")
+
+            name = hello['worker']
+            if name in self.workers:
+                await self.remove_worker(self.workers[name], "reconectou")
+
+            node = WorkerNode(name, writer)
+            self.workers[name] = node
+            self.leases.pop(name, None)
+            self.update_held(name, hello.get('symbols', []))
+            self.log.info(f"🟢 Worker {name} conectado ({len(self.workers)} ativos)")
+
+            # O PnL do worker que voltou deixa de ser "retirado": ele volta a vir nos reports desse worker
+            carried = self.retired_by_worker.pop(name, 0.0)
+            self.retired_pnl -= carried
+            await send(writer, {
+                'type': 'config', 'bot_config': self.bot_config, 'halted': self.risk.halted, 'realized_pnl': carried,
+            })
+            self.rebalance()
+            await self.push_assignments()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                node.last_seen = time.monotonic()
+                if message.get('type') == 'report':
+                    node.report = message
+                    if self.update_held(name, message.get('symbols', [])):
+                        await self.push_assignments()  # Símbolo liberado: pode ir para o novo dono
+
+        except Exception as e:
+            self.log.error(f"Erro na conexão com worker: {e}")
+        finally:
+            if node and self.workers.get(node.name) is node:
+                await self.remove_worker(node, "conexão encerrada")
+            else:
+                writer.close()
+
+    async def remove_worker(self, node: WorkerNode, reason: str) -> None:
+        """Tira o worker do cluster e redistribui os seus símbolos"""
+        self.workers.pop(node.name, None)
+        realized = node.report.get('realized_pnl', 0.0)
+        self.retired_pnl += realized
+        self.retired_by_worker[node.name] = self.retired_by_worker.get(node.name, 0.0) + realized
+        node.writer.close()
+        # Os bots dele podem ainda estar rodando (ex.: loop travado): os símbolos ficam presos até ele voltar
+        # sem eles ou o lease expirar
+        self.leases[node.name] = node.last_seen + self.lease_timeout
+
+        self.log.info(f"🔴 Worker {node.name} removido ({reason}); símbolos: {', '.join(sorted(node.symbols)) or '-'}", level=WARNING)
+        self.rebalance()
+        await self.push_assignments()
+
+    def update_held(self, name: str, symbols: List[str]) -> bool:
+        """Atualiza os símbolos que o worker confirma rodar. Retorna True se algum foi liberado."""
+        released = False
+        for symbol, owner in list(self.held.items()):
+            if owner == name and symbol not in symbols:
+                del self.held[symbol]
+                released = True
+        for symbol in symbols:
+            self.held.setdefault(symbol, name)
+        return released
+
+    def rebalance(self) -> None:
+        """
+        Distribui os símbolos sem dono e equilibra a carga entre os workers.
+        Só move símbolos sem posição aberta (segundo o último report).
+        """
+        if not self.workers:
+            return
+
+        nodes = list(self.workers.values())
+        target = math.ceil(len(self.symbols) / len(nodes))
+        assigned = set().union(*(node.symbols for node in nodes))
+        unassigned = [symbol for symbol in self.symbols if symbol not in assigned]
+
+        for node in nodes:
+            positions = node.report.get('positions', {})
+            movable = sorted(symbol for symbol in node.symbols if symbol not in positions)
+            while len(node.symbols) > target and movable:
+                symbol = movable.pop()
+                node.symbols.discard(symbol)
+                unassigned.append(symbol)
+
+        for symbol in unassigned:
+            min(nodes, key=lambda node: len(node.symbols)).symbols.add(symbol)
+
+    async def push_assignments(self) -> None:
+        """Envia as atribuições; um símbolo que ainda roda em outro worker espera até ser liberado por ele"""
+        for node in list(self.workers.values()):
+            symbols = {symbol for symbol in node.symbols if self.held.get(symbol, node.name) == node.name}
+            if symbols == node.sent:
+                continue
+            share = self.bot_config['initial_balance'] * len(node.symbols) / max(len(self.symbols), 1)
+            try:
+                await send(node.writer, {'type': 'assign', 'symbols': sorted(symbols), 'balance': share})
+                node.sent = symbols
+                self.log.info(f"📦 {node.name}: {', '.join(sorted(symbols)) or '-'}")
+            except Exception as e:
+                self.log.error(f"Erro ao enviar símbolos para {node.name}: {e}")
+
+    async def broadcast(self, message: dict) -> None:
+        for node in list(self.workers.values()):
+            try:
+                await send(node.writer, message)
+            except Exception as e:
+                self.log.error(f"Erro ao enviar {message['type']} para {node.name}: {e}")
+
+    async def monitor(self) -> None:
+        """Detecta workers mortos e aplica os limites de risco globais"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+            now = time.monotonic()
+            for node in list(self.workers.values()):
+                if now - node.last_seen > self.heartbeat_timeout:
+                    await self.remove_worker(node, f"sem heartbeat há {now - node.last_seen:.1f}s")
+
+            for name, expiry in list(self.leases.items()):
+                if now >= expiry:
+                    del self.leases[name]
+                    if self.update_held(name, []):
+                        self.log.info(f"⌛ Lease de {name} expirado: símbolos liberados", level=WARNING)
+                        await self.push_assignments()
+
+            if time.time() >= self.risk.next_reset:
+                self.retired_pnl = 0.0
+                self.retired_by_worker.clear()
+                self.risk.reset_day()
+                await self.broadcast({'type': 'resume'})
+                self.log.info("🌅 Novo dia: limites zerados, bots retomados")
+
+            reports = [node.report for node in self.workers.values()]
+            reason = self.risk.update_totals(
+                self.retired_pnl + sum(report.get('realized_pnl', 0.0) for report in reports),
+                sum(report.get('unrealized_pnl', 0.0) for report in reports),
+                sum(report.get('exposure', 0.0) for report in reports),
+            )
+            if reason:
+                self.log.info(
+                    f"🛑 Limite global atingido ({reason}): PNL ${self.risk.daily_pnl():.2f}, drawdown ${self.risk.drawdown:.2f}",
+                    level=WARNING,
+                )
+                await self.broadcast({'type': 'halt', 'reason': reason})
+
+    def status(self) -> dict:
+        return {
+            'workers': {node.name: sorted(node.symbols) for node in self.workers.values()},
+            'daily_pnl': self.risk.daily_pnl(),
+            'drawdown': self.risk.drawdown,
+            'exposure': self.risk.exposure,
+            'halted': self.risk.halted,
+        }
+
+
+####### WORKER #########################################################################
+class ClusterWorker:
+    def __init__(self, host: str, port: int, name: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.name = name or f"{os.uname().nodename}-{os.getpid()}"
+        self.log = get_event_log()
+
+        self.bot_config: Optional[dict] = None
+        self.exchange = None
+        self.risk = None
+        self.halted: Optional[str] = None
+        self.bots: Dict[str, dict] = {}    # symbol -> {'bot', 'ws_task', 'kline_task', 'run_task'}
+
+    async def run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                await send(writer, {'type': 'hello', 'worker': self.name, 'symbols': sorted(self.bots)})
+                self.log.info(f"🔗 Worker {self.name} conectado ao coordenador {self.host}:{self.port}")
+                await self.session(reader, writer)
+            except Exception as e:
+                self.log.error(f"Erro na conexão com o coordenador: {e}")
+            finally:
+                # Sem coordenador, os símbolos podem ser entregues a outro worker: para todos os bots
+                if self.bots:
+                    self.log.info(f"⏸️ Parando {len(self.bots)} bots até reconectar", level=WARNING)
+                    await asyncio.gather(*(self.stop_bot(symbol) for symbol in list(self.bots)))
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        heartbeat = asyncio.create_task(self.heartbeat(writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("coordenador encerrou a conexão")
+                message = json.loads(line)
+
+                if message['type'] == 'config':
+                    await self.configure(message['bot_config'], message.get('halted'), message.get('realized_pnl', 0.0))
+                elif message['type'] == 'assign':
+                    await self.assign(message['symbols'], message['balance'])
+                    await send(writer, self.report())  # Confirma os símbolos liberados sem esperar o heartbeat
+                elif message['type'] == 'halt':
+                    await self.halt(message['reason'])
+                elif message['type'] == 'resume':
+                    await self.resume()
+        finally:
+            heartbeat.cancel()
+            writer.close()
+
+    async def heartbeat(self, writer: asyncio.StreamWriter) -> None:
+        while True:
+            await send(writer, self.report())
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    def report(self) -> dict:
+        risk = self.risk
+        if risk is None:
+            return {'type': 'report', 'symbols': []}
+        with risk.lock:  # Os bots atualizam o RiskEngine a partir das threads do trade()
+            return {
+                'type': 'report',
+                'symbols': sorted(self.bots),
+                'realized_pnl': risk.realized_pnl,
+                'unrealized_pnl': risk.unrealized_pnl,
+                'exposure': risk.exposure,
+                'halted': risk.halted,
+                'positions': {symbol: position[:3] for symbol, position in risk.positions.items()},
+            }
+
+    async def configure(self, bot_config: dict, halted: Optional[str], realized_pnl: float = 0.0) -> None:
+        """
+        Recebe os parâmetros dos bots. O RiskEngine é criado uma única vez e sobrevive às reconexões (os bots
+        apontam para ele); num worker novo, começa com o PnL realizado que o coordenador guardou para este nome.
+        """
+        from scalpingv2 import RiskEngine, create_exchange
+
+        self.bot_config = bot_config
+        self.halted = halted
+        if self.risk is None:
+            self.risk = RiskEngine(
+                bot_config['initial_balance'], bot_config['risk_per_trade'], bot_config['max_drawdown'], bot_config['daily_profit_target']
+            )
+            self.risk.realized_pnl = realized_pnl
+            self.risk.balance += realized_pnl
+
+        if self.exchange is None:
+            self.exchange = await asyncio.to_thread(
+                create_exchange, bot_config['simulation_mode'], {'USDT': bot_config['initial_balance']}
+            )
+            await asyncio.to_thread(self.exchange.load_markets)
+
+    async def assign(self, symbols: List[str], balance: float) -> None:
+        self.risk.balance = balance  # Parte da banca proporcional aos símbolos deste worker
+
+        await asyncio.gather(*(self.stop_bot(symbol) for symbol in list(self.bots) if symbol not in symbols))
+        for symbol in symbols:
+            if symbol not in self.bots:
+                try:
+                    await self.start_bot(symbol)
+                except Exception as e:
+                    self.log.error(f"Erro ao iniciar bot: {e}", symbol)
+
+    async def start_bot(self, symbol: str) -> None:
+        from scalpingv2 import BinanceWebSocket, TradingBot
+
+        ws = BinanceWebSocket(symbol)
+        ws_task = asyncio.create_task(ws.connect())
+        kline_task = asyncio.create_task(ws.connect_klines())  # Velas para a PaperExchange (simulação)
+        config = {key: value for key, value in self.bot_config.items() if key != 'initial_balance'}
+        bot = await asyncio.to_thread(
+            TradingBot,
+            symbol=symbol,
+            initial_balance=self.bot_config['initial_balance'],
+            websocket_client=ws,
+            exchange=self.exchange,
+            risk_engine=self.risk,
+            telegram_commands=False,
+            **config,
+        )
+        if bot.simulation_mode:
+            bot.paper_exchange = self.exchange  # Exchange compartilhada: o bot alimenta a PaperExchange com o seu preço
+
+        entry = {'bot': bot, 'ws_task': ws_task, 'kline_task': kline_task, 'run_task': None}
+        self.bots[symbol] = entry
+        if not self.halted:
+            self._start_loop(entry)
+        self.log.info(f"▶️ Bot {symbol} iniciado em {self.name}", symbol)
+
+    async def stop_bot(self, symbol: str) -> None:
+        """
+        Para o bot antes de o símbolo ir para outro worker. O loop não é cancelado: a thread de um trade() ou de
+        um fechamento em andamento continuaria rodando. O bot é acordado e o loop termina sozinho depois dela;
+        só então uma posição aberta é fechada a mercado e o símbolo deixa de aparecer nos reports.
+        """
+        entry = self.bots[symbol]
+        bot = entry['bot']
+        bot.bot_running = False
+        if entry['run_task']:
+            bot.wake()
+            await asyncio.gather(entry['run_task'], return_exceptions=True)
+
+        if bot.active_position:
+            self.log.info(f"🚪 Fechando a posição de {symbol} antes de entregar o símbolo", symbol, WARNING)
+            if not await asyncio.to_thread(bot.close_position_market):
+                self.log.error(f"Posição de {symbol} não foi fechada: fica só com o SL na exchange", symbol)
+
+        for task in (entry['ws_task'], entry['kline_task']):
+            task.cancel()
+        del self.bots[symbol]
+        self.log.info(f"⏹️ Bot {symbol} parado em {self.name}", symbol)
+
+    async def halt(self, reason: str) -> None:
+        """
+        Limite global atingido: marca o RiskEngine do worker e acorda os bots; cada bot fecha a própria posição
+        no seu loop (ver TradingBot.run), sem disputar a posição com o trade().
+        """
+        self.halted = reason
+        if self.risk.halted is None:
+            self.risk.halted = reason
+        for entry in self.bots.values():
+            entry['bot'].wake()
+
+    async def resume(self) -> None:
+        self.halted = None
+        self.risk.reset_day()
+        for entry in self.bots.values():
+            self._start_loop(entry)
+
+    @staticmethod
+    def _start_loop(entry: dict) -> None:
+        if entry['run_task'] and not entry['run_task'].done():
+            return
+        entry['bot'].bot_running = True
+        entry['run_task'] = asyncio.create_task(entry['bot'].run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot de trading em modo cluster (coordenador / workers)")
+    sub = parser.add_subparsers(dest='role', required=True)
+
+    coordinator = sub.add_parser('coordinator', help="Distribui os símbolos e aplica os limites globais")
+    coordinator.add_argument('--symbols', required=True, help="Ex.: XRP/USDT,ADA/USDT")
+    coordinator.add_argument('--host', default='0.0.0.0')
+    coordinator.add_argument('--port', type=int, default=8765)
+    coordinator.add_argument('--initial-balance', type=float, default=40, help="Banca total da conta")
+    coordinator.add_argument('--risk-per-trade', type=float, default=0.25)
+    coordinator.add_argument('--max-drawdown', type=float, default=0.15)
+    coordinator.add_argument('--daily-profit-target', type=float, default=0.30)
+    coordinator.add_argument('--simulation', action='store_true')
+
+    worker = sub.add_parser('worker', help="Roda os bots dos símbolos atribuídos")
+    worker.add_argument('--coordinator', default='127.0.0.1:8765', help="host:porta")
+    worker.add_argument('--name', default=None)
+
+    args = parser.parse_args()
+
+    if args.role == 'coordinator':
+        bot_config = {
+            'initial_balance': args.initial_balance,
+            'risk_per_trade': args.risk_per_trade,
+            'max_drawdown': args.max_drawdown,
+            'daily_profit_target': args.daily_profit_target,
+            'simulation_mode': args.simulation,
+        }
+        symbols = [s.strip().upper() for s in args.symbols.split(',')]
+        runner = Coordinator(symbols, bot_config, args.host, args.port).run()
+    else:
+        host, _, port = args.coordinator.rpartition(':')
+        runner = ClusterWorker(host, int(port), args.name).run()
+
+    try:
+        asyncio.run(runner)
+    except KeyboardInterrupt:
+        print("\n🛑 Encerrando...")
+
+
+if __name__ == '__main__':
+    main()
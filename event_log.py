@@ -0,0 +1,273 @@
+"""
+Log estruturado de eventos do bot.
+
+- No caminho de trading, registrar um evento custa uma checagem de nível e um único `put` numa fila;
+  formatação, JSON e escrita em disco ficam numa thread em background.
+- Eventos tipados: tick, signal, order, fill, error (e info para o resto), cada um com nível e campos livres.
+- Eventos de alta frequência (ticks) podem ser amostrados: `sample={'tick': 10}` grava 1 a cada 10. Os ticks
+  usam o nível `tick_level` (INFO por padrão, então 1 a cada 10 vai para o arquivo e o terminal; DEBUG os esconde).
+- Os eventos são gravados em JSONL, um arquivo por dia e por processo, e podem ser consultados depois
+  com `query` ou pela linha de comando.
+
+Uso:
+    python event_log.py --tipos order,fill --simbolo XRP/USDT --inicio 2026-10-19T13:00
+"""
+import argparse
+import atexit
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+TICK, SIGNAL, ORDER, FILL, ERROR_EVENT, INFO_EVENT = 'tick', 'signal', 'order', 'fill', 'error', 'info'
+
+# Linhas do terminal para eventos sem mensagem (montadas na thread de escrita)
+CONSOLE_FORMATS = {
+    TICK: "🔎 RSI: {rsi:.2f}, Volume: {volume:.2f}, MACD: {macd:.4f}, Signal Line: {signal_line:.4f}, ATR: {atr} - {symbol} a {price}",
+    SIGNAL: "📡 Sinal de {side} em {symbol} a {price} (RSI: {rsi:.2f})",
+    FILL: "✅ Execução {side} {symbol} a {price}",
+}
+
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "logs")
+EVENT_LOG_LEVEL = os.getenv("EVENT_LOG_LEVEL", "INFO")           # Nível mínimo gravado
+EVENT_LOG_CONSOLE = os.getenv("EVENT_LOG_CONSOLE", "INFO")       # Nível mínimo mostrado no terminal
+EVENT_LOG_SAMPLE = os.getenv("EVENT_LOG_SAMPLE", "tick=10")      # Amostragem por tipo (ex.: tick=10,signal=1)
+EVENT_LOG_TICK_LEVEL = os.getenv("EVENT_LOG_TICK_LEVEL", "INFO")  # Nível dos eventos de tick
+
+
+class EventLog:
+    def __init__(self, log_dir: str = EVENT_LOG_DIR, level: int = INFO, console_level: int = INFO,
+                 sample: Optional[Dict[str, int]] = None, flush_interval: float = 1.0, drain_interval: float = 0.05,
+                 tick_level: int = INFO):
+        self.log_dir = log_dir
+        self.level = level
+        self.console_level = console_level
+        self.tick_level = tick_level
+        self.min_level = min(level, console_level)  # Abaixo disso o evento é descartado sem ir para a fila
+        self.sample = dict(sample or {})
+        self.flush_interval = flush_interval    # Tempo máximo (s) até o evento chegar ao disco
+        self.drain_interval = drain_interval    # Intervalo (s) entre as leituras da fila
+
+        self.queue = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.counter_lock = threading.Lock()    # Os bots podem emitir de várias threads (ex.: asyncio.to_thread)
+        self.counters: Dict[str, int] = {}
+        self.dropped = 0    # Eventos descartados pela amostragem
+
+        self._file = None
+        self._day = None
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def from_env(cls) -> 'EventLog':
+        """Configuração pelas variáveis EVENT_LOG_*"""
+        sample = {}
+        for item in filter(None, EVENT_LOG_SAMPLE.split(',')):
+            event_type, _, every = item.partition('=')
+            sample[event_type.strip()] = int(every)
+        return cls(
+            EVENT_LOG_DIR, LEVELS[EVENT_LOG_LEVEL.upper()], LEVELS[EVENT_LOG_CONSOLE.upper()], sample,
+            tick_level=LEVELS[EVENT_LOG_TICK_LEVEL.upper()],
+        )
+
+    ####### REGISTRO (caminho de trading) #################################################
+    def emit(self, event_type: str, level: int, symbol: Optional[str] = None, msg: Optional[str] = None, **fields) -> None:
+        """Enfileira um evento. Não formata nem escreve nada aqui."""
+        if level < self.min_level:
+            return
+
+        every = self.sample.get(event_type)
+        if every and every > 1:
+            with self.counter_lock:
+                count = self.counters.get(event_type, 0)
+                self.counters[event_type] = count + 1
+                if count % every:
+                    self.dropped += 1
+                    return
+
+        if self.thread is None:
+            self.start()
+        self.queue.put((time.time(), level, event_type, symbol, msg, fields))
+
+    def tick(self, symbol: str, price: float, msg: Optional[str] = None, **fields) -> None:
+        """Avaliação de um tick (preço e indicadores); alta frequência, nível `tick_level` e amostrado"""
+        if self.tick_level < self.min_level:
+            return
+        self.emit(TICK, self.tick_level, symbol, msg, price=price, **fields)
+
+    def signal(self, symbol: str, side: str, msg: Optional[str] = None, **fields) -> None:
+        self.emit(SIGNAL, INFO, symbol, msg, side=side, **fields)
+
+    def order(self, symbol: str, side: str, msg: Optional[str] = None, **fields) -> None:
+        self.emit(ORDER, INFO, symbol, msg, side=side, **fields)
+
+    def fill(self, symbol: str, side: str, price: float, msg: Optional[str] = None, **fields) -> None:
+        self.emit(FILL, INFO, symbol, msg, side=side, price=price, **fields)
+
+    def error(self, msg: str, symbol: Optional[str] = None, **fields) -> None:
+        self.emit(ERROR_EVENT, ERROR, symbol, msg, **fields)
+
+    def info(self, msg: str, symbol: Optional[str] = None, level: int = INFO, **fields) -> None:
+        self.emit(INFO_EVENT, level, symbol, msg, **fields)
+
+    ####### ESCRITA (thread em background) ################################################
+    def start(self) -> 'EventLog':
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+                self.thread.start()
+                atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None:
+        """Grava os eventos pendentes e fecha o arquivo"""
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self) -> None:
+        # Esvazia a fila em lotes: um `put` não acorda esta thread, então o caminho de trading não disputa o GIL
+        while True:
+            time.sleep(self.drain_interval)
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._close()
+                    return
+                self._write(item)
+
+            if self._file and time.monotonic() - self._last_flush >= self.flush_interval:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+    def _write(self, item: tuple) -> None:
+        ts, level, event_type, symbol, msg, fields = item
+
+        if level >= self.console_level:
+            print(format_console(event_type, symbol, msg, fields))
+
+        if level < self.level:
+            return
+
+        try:
+            day = time.strftime('%Y-%m-%d', time.gmtime(ts))
+            if day != self._day:
+                self._close()
+                os.makedirs(os.path.join(self.log_dir, day), exist_ok=True)
+                self._file = open(os.path.join(self.log_dir, day, f"events-{os.getpid()}.jsonl"), 'a')
+                self._day = day
+
+            record = {'ts': ts, 'level': LEVEL_NAMES.get(level, level), 'type': event_type}
+            if symbol:
+                record['symbol'] = symbol
+            if msg:
+                record['msg'] = msg
+            record.update(fields)
+            self._file.write(json.dumps(record, default=str, ensure_ascii=False) + '\n')
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar evento: {e}")
+
+    def _close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+            self._day = None
+
+
+def format_console(event_type: str, symbol: Optional[str], msg: Optional[str], fields: dict) -> str:
+    if msg:
+        if fields and event_type in (INFO_EVENT, ERROR_EVENT):
+            return msg + " | " + ", ".join(f"{key}: {value}" for key, value in fields.items())
+        return msg
+    try:
+        return CONSOLE_FORMATS[event_type].format(symbol=symbol, **fields)
+    except (KeyError, ValueError, TypeError):
+        return f"[{event_type}] {symbol or ''} {fields}"
+
+
+_default: Optional[EventLog] = None
+_default_lock = threading.Lock()
+
+
+def get_event_log() -> EventLog:
+    """Log compartilhado pelos bots do processo (um único arquivo e uma única thread de escrita)"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = EventLog.from_env()
+        return _default
+
+
+def query(log_dir: str = EVENT_LOG_DIR, start: Optional[float] = None, end: Optional[float] = None,
+          types: Optional[List[str]] = None, symbol: Optional[str] = None, min_level: int = DEBUG) -> Iterator[dict]:
+    """Percorre os eventos gravados (de todos os processos) em ordem de tempo, com filtros opcionais"""
+    first_day = time.strftime('%Y-%m-%d', time.gmtime(start)) if start else None
+    last_day = time.strftime('%Y-%m-%d', time.gmtime(end)) if end else None
+
+    for day_dir in sorted(glob.glob(os.path.join(log_dir, '????-??-??'))):
+        day = os.path.basename(day_dir)
+        if (first_day and day < first_day) or (last_day and day > last_day):
+            continue
+
+        events = []
+        for path in glob.glob(os.path.join(day_dir, 'events-*.jsonl')):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue    # Linha incompleta (processo encerrado no meio da escrita)
+                    if start and event['ts'] < start or end and event['ts'] >= end:
+                        continue
+                    if types and event['type'] not in types:
+                        continue
+                    if symbol and event.get('symbol') != symbol:
+                        continue
+                    if LEVELS.get(event['level'], 0) < min_level:
+                        continue
+                    events.append(event)
+
+        events.sort(key=lambda event: event['ts'])
+        yield from events
+
+
+def main():
+    from recorder import parse_time
+
+    parser = argparse.ArgumentParser(description="Consulta o log de eventos do bot")
+    parser.add_argument('--dir', default=EVENT_LOG_DIR)
+    parser.add_argument('--inicio', default=None)
+    parser.add_argument('--fim', default=None)
+    parser.add_argument('--tipos', default=None, help="Ex.: order,fill,error")
+    parser.add_argument('--simbolo', default=None)
+    parser.add_argument('--nivel', default='DEBUG', choices=list(LEVELS))
+    args = parser.parse_args()
+
+    events = query(
+        args.dir,
+        parse_time(args.inicio) if args.inicio else None,
+        parse_time(args.fim) if args.fim else None,
+        args.tipos.split(',') if args.tipos else None,
+        args.simbolo,
+        LEVELS[args.nivel],
+    )
+    for event in events:
+        when = datetime.fromtimestamp(event.pop('ts'), tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        print(f"{when} {event.pop('level'):<7} {event.pop('type'):<6} {event.pop('symbol', ''):<10} {json.dumps(event, ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
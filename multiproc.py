@@ -0,0 +1,416 @@
+"""
+Modo multiprocesso.
+
+- Processo de market data: dono das conexões WebSocket; grava preços e velas já decodificados em ring buffers
+  de memória compartilhada (um escritor, vários leitores, sem locks).
+- N processos de estratégia: cada um roda TradingBot para um subconjunto dos símbolos, lendo os buffers
+  através de views numpy sobre a memória compartilhada (cada leitura copia só as entradas pedidas).
+- Processo de execução: único dono do cliente da exchange; recebe as chamadas dos workers por fila,
+  então o rate limit da Binance é respeitado em um só lugar.
+
+Uso:
+    python multiproc.py --symbols XRP/USDT,ADA/USDT,DOGE/USDT,SOL/USDT --workers 2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional
+
+import numpy as np
+import websockets
+
+TICK_FIELDS = 3     # seq, timestamp (ms), preço
+CANDLE_FIELDS = 7   # seq, timestamp (ms), open, high, low, close, volume
+FEED_POLL_INTERVAL = 0.01   # Intervalo (s) de leitura dos buffers nos workers
+EXECUTION_TIMEOUT = 30      # Tempo máximo (s) de espera por uma resposta do processo de execução
+
+
+class SharedMarketData:
+    """
+    Ring buffers de preços e velas por símbolo em memória compartilhada.
+
+    Ticks: cada entrada guarda o próprio número de sequência, gravado por último pelo escritor; o leitor confere
+    a sequência depois de ler os valores e tenta de novo se a entrada estiver sendo reescrita.
+
+    Velas: a vela em formação é reescrita no mesmo slot (mesma sequência), então a sequência da entrada não
+    detecta uma leitura no meio da escrita. Cada símbolo tem um contador de versão (seqlock): ímpar durante
+    uma escrita, incrementado de novo no fim; o leitor copia as velas entre duas leituras iguais e pares dele.
+    """
+    def __init__(self, symbols: List[str], tick_slots: int = 1024, candle_slots: int = 512, name: Optional[str] = None, create: bool = False):
+        self.symbols = symbols
+        self.index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.tick_slots = tick_slots
+        self.candle_slots = candle_slots
+
+        count = len(symbols)
+        heads_size = count * 3 * 8
+        ticks_size = count * tick_slots * TICK_FIELDS * 8
+        candles_size = count * candle_slots * CANDLE_FIELDS * 8
+
+        if create:
+            self.shm = SharedMemory(name=name, create=True, size=heads_size + ticks_size + candles_size)
+        else:
+            self.shm = SharedMemory(name=name)
+
+        buf = self.shm.buf
+        # [última seq de tick, última seq de vela, versão das velas (seqlock)]
+        self.heads = np.ndarray((count, 3), dtype=np.int64, buffer=buf)
+        self.ticks = np.ndarray((count, tick_slots, TICK_FIELDS), dtype=np.float64, buffer=buf, offset=heads_size)
+        self.candles = np.ndarray((count, candle_slots, CANDLE_FIELDS), dtype=np.float64, buffer=buf, offset=heads_size + ticks_size)
+
+        if create:
+            self.heads[:] = 0
+            self.ticks[:] = 0
+            self.candles[:] = 0
+
+    def spec(self) -> dict:
+        """Parâmetros para outro processo abrir os mesmos buffers"""
+        return {'name': self.shm.name, 'symbols': self.symbols, 'tick_slots': self.tick_slots, 'candle_slots': self.candle_slots}
+
+    @classmethod
+    def attach(cls, spec: dict) -> 'SharedMarketData':
+        return cls(spec['symbols'], spec['tick_slots'], spec['candle_slots'], name=spec['name'])
+
+    def close(self):
+        # Solta as views antes de fechar o mapeamento
+        del self.heads, self.ticks, self.candles
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    ####### ESCRITA (apenas o processo de market data) ####################################
+    def write_tick(self, i: int, timestamp: float, price: float) -> None:
+        seq = int(self.heads[i, 0]) + 1
+        slot = self.ticks[i, seq % self.tick_slots]
+        slot[0] = -1
+        slot[1] = timestamp
+        slot[2] = price
+        slot[0] = seq   # Publica a entrada
+        self.heads[i, 0] = seq
+
+    def write_candle(self, i: int, candle) -> None:
+        """Grava [timestamp, open, high, low, close, volume]; a vela em formação é atualizada no mesmo slot"""
+        seq = int(self.heads[i, 1])
+        slot = self.candles[i, seq % self.candle_slots]
+
+        if seq == 0 or slot[1] != candle[0]:
+            seq += 1
+            slot = self.candles[i, seq % self.candle_slots]
+
+        self.heads[i, 2] += 1   # Ímpar: escrita em andamento
+        slot[0] = -1
+        slot[1:] = candle
+        slot[0] = seq
+        self.heads[i, 1] = seq
+        self.heads[i, 2] += 1   # Par: velas consistentes
+
+    ####### LEITURA ######################################################################
+    def last_tick(self, i: int):
+        """Retorna (seq, preço) do último tick do símbolo; (0, None) se ainda não houver"""
+        while True:
+            seq = int(self.heads[i, 0])
+            if seq == 0:
+                return 0, None
+            slot = self.ticks[i, seq % self.tick_slots]
+            price = float(slot[2])
+            if slot[0] == seq:
+                return seq, price
+
+    def read_candles(self, i: int, limit: int) -> List[list]:
+        """Retorna as últimas `limit` velas (a última pode estar em formação), no formato do fetch_ohlcv"""
+        while True:
+            version = int(self.heads[i, 2])
+            if version % 2:
+                continue    # Escrita em andamento
+            seq = int(self.heads[i, 1])
+            count = min(limit, seq, self.candle_slots - 1)
+            if count <= 0:
+                return []
+
+            seqs = np.arange(seq - count + 1, seq + 1)
+            rows = self.candles[i, seqs % self.candle_slots]   # Cópia
+            if int(self.heads[i, 2]) == version and np.array_equal(rows[:, 0], seqs):
+                return rows[:, 1:].tolist()
+
+
+class SharedPriceFeed:
+    """Substitui o BinanceWebSocket nos workers: lê o último preço do buffer compartilhado"""
+    def __init__(self, market_data: SharedMarketData, symbol: str):
+        self.market_data = market_data
+        self.symbol = symbol
+        self.index = market_data.index[symbol]
+        self.price = None
+        self.seq = 0
+        self.listeners = []
+
+    def poll(self) -> None:
+        """Chama os listeners se houver um preço novo"""
+        seq, price = self.market_data.last_tick(self.index)
+        if seq == self.seq:
+            return
+        self.seq = seq
+        self.price = price
+        for listener in self.listeners:
+            listener(price)
+
+    def get_price(self):
+        return self.price
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def change_symbol(self, new_symbol: str):
+        raise Exception("Troca de par não suportada no modo multiprocesso")
+
+
+class RemoteExchange:
+    """
+    Proxy com a interface do ccxt: as chamadas são executadas pelo processo de execução.
+
+    Métodos puros (precisão, mercado) rodam localmente com os mercados recebidos na inicialização, e
+    `fetch_ohlcv` no timeframe do market data é servido direto da memória compartilhada.
+    """
+    LOCAL_METHODS = ('market', 'market_id', 'price_to_precision', 'amount_to_precision')
+
+    def __init__(self, worker_id: int, requests, replies, market_data: Optional[SharedMarketData] = None, timeframe: str = '5m'):
+        import ccxt
+
+        self.worker_id = worker_id
+        self.requests = requests
+        self.replies = replies
+        self.market_data = market_data
+        self.timeframe = timeframe
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+        self.markets = self._call('__markets__')
+        self.local = ccxt.binance()
+        self.local.set_markets(self.markets)
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        if self.market_data and timeframe == self.timeframe and since is None and symbol in self.market_data.index:
+            candles = self.market_data.read_candles(self.market_data.index[symbol], limit or 500)
+            if len(candles) >= (limit or 1):
+                return candles
+        return self._call('fetch_ohlcv', symbol, timeframe, since, limit, params or {})
+
+    def _call(self, method: str, *args, **kwargs):
+        with self.lock:
+            self.next_id += 1
+            request_id = self.next_id
+            self.requests.put((self.worker_id, request_id, method, args, kwargs))
+
+            while True:
+                reply_id, ok, result = self.replies.get(timeout=EXECUTION_TIMEOUT)
+                if reply_id == request_id:
+                    break
+
+        if not ok:
+            raise Exception(result)
+        return result
+
+    def __getattr__(self, name):
+        if name in self.LOCAL_METHODS:
+            return getattr(self.local, name)
+        return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+
+
+####### PROCESSOS #######################################################################
+def run_market_data(spec: dict, timeframe: str) -> None:
+    """Processo de market data: preenche o histórico de velas e grava os streams nos buffers"""
+    import ccxt
+
+    market_data = SharedMarketData.attach(spec)
+
+    # Histórico inicial para os indicadores (API pública, sem credenciais)
+    public = ccxt.binance({'enableRateLimit': True})
+    for symbol, i in market_data.index.items():
+        try:
+            for candle in public.fetch_ohlcv(symbol, timeframe, limit=market_data.candle_slots - 1):
+                market_data.write_candle(i, candle)
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar histórico de {symbol}: {e}")
+
+    asyncio.run(stream_market_data(market_data, timeframe))
+
+
+async def stream_market_data(market_data: SharedMarketData, timeframe: str) -> None:
+    from scalpingv2 import BinanceWebSocket
+
+    index_by_id = {symbol.replace('/', '').upper(): i for symbol, i in market_data.index.items()}
+    streams = [
+        f"{symbol_id.lower()}@{name}" for symbol_id in index_by_id for name in ('ticker', f"kline_{timeframe}")
+    ]
+
+    batch = BinanceWebSocket.COMBINED_STREAMS_PER_CONNECTION
+    await asyncio.gather(*(
+        _stream_connection(market_data, streams[i:i + batch], index_by_id) for i in range(0, len(streams), batch)
+    ))
+
+
+async def _stream_connection(market_data: SharedMarketData, streams: List[str], index_by_id: Dict[str, int]) -> None:
+    url = "wss://stream.binance.com:9443/stream?streams=" + "/".join(streams)
+    while True:
+        try:
+            async with websockets.connect(url, max_queue=None) as websocket:
+                async for message in websocket:
+                    data = json.loads(message)['data']
+                    i = index_by_id[data['s']]
+
+                    if data['e'] == '24hrTicker':
+                        market_data.write_tick(i, data['E'], float(data['c']))
+                    elif data['e'] == 'kline':
+                        k = data['k']
+                        market_data.write_candle(i, (k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])))
+
+        except Exception as e:
+            print(f"⚠️ Erro WebSocket (market data): {e}")
+            await asyncio.sleep(5)
+
+
+def run_execution(requests, replies: list, simulation_mode: bool, spec: dict, paper_balance: float) -> None:
+    """Processo de execução: único dono do cliente da exchange"""
+    from scalpingv2 import create_exchange
+
+    exchange = create_exchange(simulation_mode, {'USDT': paper_balance})
+    exchange.load_markets()
+
+    if simulation_mode:
+        # A PaperExchange executa TP/SL com os preços dos buffers compartilhados
+        market_data = SharedMarketData.attach(spec)
+        feeds = [SharedPriceFeed(market_data, symbol) for symbol in market_data.index]
+        for feed in feeds:
+            feed.add_listener(lambda price, symbol=feed.symbol: exchange.on_price(symbol, price))
+        threading.Thread(target=_poll_feeds, args=(feeds,), name='paper-feed', daemon=True).start()
+
+    print(f"🏦 Processo de execução pronto ({'paper trading' if simulation_mode else 'produção'})")
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+
+        worker_id, request_id, method, args, kwargs = item
+        try:
+            result = exchange.markets if method == '__markets__' else getattr(exchange, method)(*args, **kwargs)
+            replies[worker_id].put((request_id, True, result))
+        except Exception as e:
+            replies[worker_id].put((request_id, False, f"{type(e).__name__}: {e}"))
+
+
+def _poll_feeds(feeds: List[SharedPriceFeed]) -> None:
+    while True:
+        for feed in feeds:
+            feed.poll()
+        time.sleep(FEED_POLL_INTERVAL)
+
+
+def run_worker(worker_id: int, symbols: List[str], spec: dict, requests, replies, timeframe: str, bot_config: dict) -> None:
+    """Processo de estratégia: um TradingBot por símbolo, compartilhando o RiskEngine do worker"""
+    from scalpingv2 import RiskEngine, TradingBot
+
+    market_data = SharedMarketData.attach(spec)
+    exchange = RemoteExchange(worker_id, requests, replies, market_data, timeframe)
+    risk = RiskEngine(
+        bot_config['initial_balance'], bot_config['risk_per_trade'], bot_config['max_drawdown'], bot_config['daily_profit_target']
+    )
+
+    feeds, bots = [], []
+    for symbol in symbols:
+        feed = SharedPriceFeed(market_data, symbol)
+        bot = TradingBot(
+            symbol=symbol,
+            websocket_client=feed,
+            exchange=exchange,
+            risk_engine=risk,
+            telegram_commands=False,
+            **bot_config,
+        )
+        bot.bot_running = True
+        feeds.append(feed)
+        bots.append(bot)
+
+    print(f"🤖 Worker {worker_id} rodando {', '.join(symbols)}")
+    asyncio.run(_worker_loop(feeds, bots))
+
+
+async def _worker_loop(feeds: List[SharedPriceFeed], bots: list) -> None:
+    async def poll():
+        while True:
+            for feed in feeds:
+                feed.poll()
+            await asyncio.sleep(FEED_POLL_INTERVAL)
+
+    await asyncio.gather(poll(), *(bot.run() for bot in bots))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot de trading em modo multiprocesso")
+    parser.add_argument('--symbols', required=True, help="Ex.: XRP/USDT,ADA/USDT")
+    parser.add_argument('--workers', type=int, default=max(mp.cpu_count() - 2, 1))
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--initial-balance', type=float, default=40)
+    parser.add_argument('--risk-per-trade', type=float, default=0.25)
+    parser.add_argument('--max-drawdown', type=float, default=0.15)
+    parser.add_argument('--daily-profit-target', type=float, default=0.30)
+    parser.add_argument('--simulation', action='store_true')
+    args = parser.parse_args()
+
+    symbols = [s.strip().upper() for s in args.symbols.split(',')]
+    workers = min(args.workers, len(symbols))
+    bot_config = {
+        'initial_balance': args.initial_balance,
+        'risk_per_trade': args.risk_per_trade,
+        'max_drawdown': args.max_drawdown,
+        'daily_profit_target': args.daily_profit_target,
+        'simulation_mode': args.simulation,
+    }
+
+    ctx = mp.get_context('spawn')
+    market_data = SharedMarketData(symbols, create=True)
+    requests = ctx.Queue()
+    replies = [ctx.Queue() for _ in range(workers)]
+
+    processes = [
+        ctx.Process(target=run_market_data, args=(market_data.spec(), args.timeframe), name='market-data'),
+        ctx.Process(
+            target=run_execution,
+            args=(requests, replies, args.simulation, market_data.spec(), args.initial_balance * workers),
+            name='execution',
+        ),
+    ]
+    for worker_id in range(workers):
+        shard = symbols[worker_id::workers]
+        processes.append(ctx.Process(
+            target=run_worker,
+            args=(worker_id, shard, market_data.spec(), requests, replies[worker_id], args.timeframe, bot_config),
+            name=f'worker-{worker_id}',
+        ))
+
+    print(f"🚀 Iniciando {len(processes)} processos ({workers} workers para {len(symbols)} símbolos)")
+    for process in processes:
+        process.start()
+
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(1)
+        dead = [process.name for process in processes if not process.is_alive()]
+        print(f"❌ Processo encerrado: {', '.join(dead)}. Parando os demais.")
+    except KeyboardInterrupt:
+        print("\n🛑 Encerrando processos...")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        market_data.close()
+        market_data.unlink()
+
+
+if __name__ == '__main__':
+    main()
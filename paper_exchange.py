@@ -0,0 +1,314 @@
+"""
+Exchange local para paper trading, alimentada pelos preços do WebSocket.
+
+Simula as ordens do bot com a mesma interface (parcial) do ccxt, sem REST para ordens e saldos:
+- ordens a mercado executadas no último preço, com slippage e taxa configuráveis;
+- TAKE_PROFIT_LIMIT / STOP_LOSS_LIMIT / limit ficam em heaps de gatilho por símbolo, verificados a cada preço;
+- `order.cancelReplace` (usado pelo StopManager) é suportado, inclusive a falha parcial da Binance (STOP_ON_FAILURE);
+- saldos virtuais por moeda.
+
+Metadados de mercado (precisão, limites) e velas vêm de um cliente público do ccxt; as velas ficam em cache
+por `ohlcv_ttl` segundos e são compartilhadas por todos os bots que usam a mesma instância. Com velas enviadas
+via `on_candle` (o TradingBot repassa o stream de kline), só a carga inicial do histórico usa REST.
+"""
+import heapq
+import itertools
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+import ccxt
+
+PAPER_FEE_RATE = 0.001      # Taxa por execução (0.1%, taxa padrão da Binance spot)
+PAPER_SLIPPAGE = 0.0005     # Slippage das execuções a mercado (0.05%)
+
+
+def fill_price(side: str, price: float, slippage: float = PAPER_SLIPPAGE) -> float:
+    """Preço de execução a mercado: sempre contra quem envia a ordem"""
+    return price * (1 + slippage) if side == 'buy' else price * (1 - slippage)
+
+
+def cancel_replace_error(code: int, cancel_result: str, new_order_result: str, cancel_error: str,
+                         new_order_error: str) -> ccxt.ExchangeError:
+    """Erro no formato do ccxt para um cancelReplace que falhou (nome da exchange + corpo JSON da Binance)"""
+    data = {'cancelResult': cancel_result, 'newOrderResult': new_order_result}
+    if cancel_error:
+        data['cancelResponse'] = {'code': -2011, 'msg': cancel_error}
+    if new_order_error:
+        data['newOrderResponse'] = {'code': -2010, 'msg': new_order_error}
+    message = 'Order cancel-replace partially failed.' if code == -2021 else 'Order cancel-replace failed.'
+    return ccxt.ExchangeError('binance ' + json.dumps({'code': code, 'msg': message, 'data': data}))
+
+
+class PaperExchange:
+    def __init__(self, balances: Optional[Dict[str, float]] = None, fee_rate: float = PAPER_FEE_RATE,
+                 slippage: float = PAPER_SLIPPAGE, ohlcv_ttl: float = 10.0, public=None):
+        self.public = public or ccxt.binance({'enableRateLimit': True})  # Só endpoints públicos
+        self.balances: Dict[str, float] = dict(balances or {'USDT': 1000.0})
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+        self.ohlcv_ttl = ohlcv_ttl
+
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.prices: Dict[str, float] = {}
+        self.orders: Dict[str, dict] = {}
+        self.open_ids: Dict[str, set] = {}
+        # symbol -> (heap que dispara com preço >= nível, heap que dispara com preço <= nível)
+        self.triggers: Dict[str, tuple] = {}
+        self.ohlcv: Dict[str, Dict[str, tuple]] = {}   # symbol -> timeframe -> (atualizado em, velas)
+        self.pushed = set()                             # (symbol, timeframe) alimentados por on_candle
+
+    def __getattr__(self, name):
+        if name == 'public':
+            raise AttributeError(name)
+        # Metadados de mercado e endpoints públicos: markets, market(), price_to_precision(), load_markets()...
+        return getattr(self.public, name)
+
+    ####### EVENTOS DE MERCADO ############################################################
+    def on_price(self, symbol: str, price: float) -> None:
+        """Atualiza o preço do símbolo e executa as ordens cujo gatilho foi atingido"""
+        with self.lock:
+            self.prices[symbol] = price
+
+            # Mantém a vela em formação do cache atualizada entre as consultas; uma vela já fechada não muda,
+            # o tick abre a vela do período atual
+            now = self._now()
+            for timeframe, (_, candles) in self.ohlcv.get(symbol, {}).items():
+                if not candles:
+                    continue
+                period = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+                last = candles[-1]
+                if now < last[0] + period:
+                    last[2], last[3], last[4] = max(last[2], price), min(last[3], price), price
+                else:
+                    candles.append([now - now % period, price, price, price, price, 0.0])
+                    del candles[:-500]
+
+            heaps = self.triggers.get(symbol)
+            if not heaps:
+                return
+            rising, falling = heaps
+
+            while rising and rising[0][0] <= price:
+                _, _, order_id, stage = heapq.heappop(rising)
+                self._on_trigger(order_id, stage, price)
+            while falling and -falling[0][0] >= price:
+                _, _, order_id, stage = heapq.heappop(falling)
+                self._on_trigger(order_id, stage, price)
+
+    def on_candle(self, symbol: str, timeframe: str, candle: list) -> None:
+        """Recebe uma vela (ex.: stream de kline); a partir daí fetch_ohlcv não usa mais REST para o par"""
+        with self.lock:
+            self.pushed.add((symbol, timeframe))
+            timeframes = self.ohlcv.setdefault(symbol, {})
+            candles = timeframes.get(timeframe, (0, []))[1]
+            if candles and candles[-1][0] == candle[0]:
+                candles[-1] = list(candle)
+            else:
+                candles.append(list(candle))
+                del candles[:-500]
+            timeframes[timeframe] = (time.time(), candles)
+
+    ####### INTERFACE CCXT ################################################################
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        with self.lock:
+            cached = self.ohlcv.get(symbol, {}).get(timeframe)
+            fresh = cached and ((symbol, timeframe) in self.pushed or time.time() - cached[0] < self.ohlcv_ttl)
+            if fresh and since is None and len(cached[1]) >= (limit or 1):
+                return [list(c) for c in cached[1][-(limit or 500):]]
+
+        candles = self.public.fetch_ohlcv(symbol, timeframe, since, max(limit or 500, 100))
+        if since is None:
+            with self.lock:
+                self.ohlcv.setdefault(symbol, {})[timeframe] = (time.time(), candles)
+        return [list(c) for c in candles[-(limit or 500):]]
+
+    def fetch_balance(self, params=None):
+        with self.lock:
+            balance = {'free': {}, 'used': {}, 'total': {}, 'info': {}}
+            for currency, amount in self.balances.items():
+                balance[currency] = {'free': amount, 'used': 0.0, 'total': amount}
+                balance['free'][currency] = amount
+                balance['used'][currency] = 0.0
+                balance['total'][currency] = amount
+            return balance
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        with self.lock:
+            last_price = self.prices.get(symbol)
+            if last_price is None:
+                raise ccxt.ExchangeError(f"PaperExchange: sem preço para {symbol}")
+
+            order = {
+                'id': str(next(self.ids)), 'clientOrderId': None, 'timestamp': self._now(), 'symbol': symbol,
+                'type': type, 'side': side, 'amount': float(amount), 'price': float(price) if price else None,
+                'stopPrice': float(params['stopPrice']) if params.get('stopPrice') else None,
+                'filled': 0.0, 'remaining': float(amount), 'average': None, 'cost': 0.0,
+                'status': 'open', 'fee': None, 'trades': [], 'info': {},
+            }
+
+            if type == 'market':
+                self._fill(order, fill_price(side, last_price, self.slippage))
+                if order['status'] != 'closed':
+                    raise ccxt.InsufficientFunds(f"PaperExchange: saldo insuficiente para {side} {amount} {symbol}")
+                self.orders[order['id']] = order
+                return dict(order)
+
+            if type in ('TAKE_PROFIT_LIMIT', 'STOP_LOSS_LIMIT'):
+                if order['stopPrice'] is None or order['price'] is None:
+                    raise ccxt.InvalidOrder("PaperExchange: stopPrice e price são obrigatórios")
+                rising = self._stop_rises(type, side)
+                if (last_price >= order['stopPrice']) if rising else (last_price <= order['stopPrice']):
+                    raise ccxt.InvalidOrder("PaperExchange: Stop price would trigger immediately.")
+                self._add_trigger(order, order['stopPrice'], rising, 'stop')
+            elif type == 'limit':
+                self._add_trigger(order, order['price'], side == 'sell', 'limit')
+            else:
+                raise ccxt.NotSupported(f"PaperExchange: tipo de ordem não suportado: {type}")
+
+            self.orders[order['id']] = order
+            self.open_ids.setdefault(symbol, set()).add(order['id'])
+
+            # Limit já executável na hora
+            if type == 'limit':
+                self.on_price(symbol, last_price)
+            return dict(order)
+
+    def cancel_order(self, id, symbol=None, params=None):
+        with self.lock:
+            order = self._get(id)
+            if order['status'] != 'open':
+                raise ccxt.OrderNotFound(f"PaperExchange: ordem {id} não está aberta")
+            order['status'] = 'canceled'
+            self.open_ids[order['symbol']].discard(order['id'])
+            return dict(order)
+
+    def cancel_all_orders(self, symbol=None, params=None):
+        with self.lock:
+            symbols = [symbol] if symbol else list(self.open_ids)
+            canceled = []
+            for s in symbols:
+                for order_id in list(self.open_ids.get(s, ())):
+                    canceled.append(self.cancel_order(order_id, s))
+            return canceled
+
+    def fetch_order(self, id, symbol=None, params=None):
+        with self.lock:
+            return dict(self._get(id))
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        with self.lock:
+            symbols = [symbol] if symbol else list(self.open_ids)
+            return [dict(self.orders[i]) for s in symbols for i in sorted(self.open_ids.get(s, ()), key=int)]
+
+    def fetch_closed_orders(self, symbol=None, since=None, limit=None, params=None):
+        with self.lock:
+            orders = [
+                dict(o) for o in self.orders.values()
+                if o['status'] == 'closed' and (symbol is None or o['symbol'] == symbol) and (since is None or o['timestamp'] >= since)
+            ]
+            return orders[-limit:] if limit else orders
+
+    def private_post_order_cancelreplace(self, params=None):
+        """
+        Equivalente ao endpoint `POST /api/v3/order/cancelReplace` (modo STOP_ON_FAILURE).
+
+        Como na Binance, não é atômico: se a nova ordem for rejeitada depois do cancelamento, a antiga continua
+        cancelada e o erro traz o corpo da resposta 409 (code -2021, `cancelResult=SUCCESS`,
+        `newOrderResult=FAILURE`). Se o cancelamento falhar, nada muda (code -2022, `NOT_ATTEMPTED`).
+        """
+        params = params or {}
+        with self.lock:
+            try:
+                old = self.cancel_order(str(params['cancelOrderId']))
+            except ccxt.BaseError as e:
+                raise cancel_replace_error(-2022, 'FAILURE', 'NOT_ATTEMPTED', str(e), '') from e
+
+            try:
+                new = self.create_order(
+                    old['symbol'], params['type'], params['side'].lower(), float(params['quantity']),
+                    float(params['price']), {'stopPrice': float(params['stopPrice'])},
+                )
+            except ccxt.BaseError as e:
+                raise cancel_replace_error(-2021, 'SUCCESS', 'FAILURE', '', str(e)) from e
+
+            return {
+                'cancelResult': 'SUCCESS',
+                'newOrderResult': 'SUCCESS',
+                'cancelResponse': {'orderId': old['id'], 'status': 'CANCELED'},
+                'newOrderResponse': {'orderId': new['id'], 'status': 'NEW'},
+            }
+
+    ####### INTERNO #######################################################################
+    @staticmethod
+    def _stop_rises(type: str, side: str) -> bool:
+        """True se o gatilho dispara com o preço subindo até o stop"""
+        if type == 'TAKE_PROFIT_LIMIT':
+            return side == 'sell'
+        return side == 'buy'   # STOP_LOSS_LIMIT
+
+    def _add_trigger(self, order: dict, level: float, rising: bool, stage: str) -> None:
+        rising_heap, falling_heap = self.triggers.setdefault(order['symbol'], ([], []))
+        if rising:
+            heapq.heappush(rising_heap, (level, int(order['id']), order['id'], stage))
+        else:
+            heapq.heappush(falling_heap, (-level, int(order['id']), order['id'], stage))
+
+    def _on_trigger(self, order_id: str, stage: str, price: float) -> None:
+        order = self.orders.get(order_id)
+        if order is None or order['status'] != 'open':
+            return  # Cancelada depois de entrar no heap (remoção preguiçosa)
+
+        if stage == 'stop':
+            # Stop atingido: vira uma ordem limit; se já executável, sai no preço de mercado (não pior que o limite)
+            marketable = price >= order['price'] if order['side'] == 'sell' else price <= order['price']
+            if not marketable:
+                self._add_trigger(order, order['price'], order['side'] == 'sell', 'limit')
+                return
+            market = fill_price(order['side'], price, self.slippage)
+            execution = max(market, order['price']) if order['side'] == 'sell' else min(market, order['price'])
+        else:
+            execution = order['price']
+
+        self._fill(order, execution)
+        if order['status'] == 'closed':
+            self.open_ids[order['symbol']].discard(order_id)
+
+    def _fill(self, order: dict, price: float) -> None:
+        """Executa a ordem inteira ao preço dado, cobrando a taxa em USDT (moeda de cotação)"""
+        base, quote = order['symbol'].split('/')
+        amount = order['amount']
+        cost = amount * price
+        fee = cost * self.fee_rate
+
+        if order['side'] == 'buy':
+            if self.balances.get(quote, 0.0) < cost + fee:
+                order['status'] = 'canceled' if order['type'] != 'market' else 'rejected'
+                return
+            self.balances[quote] = self.balances.get(quote, 0.0) - cost - fee
+            self.balances[base] = self.balances.get(base, 0.0) + amount
+        else:
+            if self.balances.get(base, 0.0) < amount:
+                order['status'] = 'canceled' if order['type'] != 'market' else 'rejected'
+                return
+            self.balances[base] = self.balances.get(base, 0.0) - amount
+            self.balances[quote] = self.balances.get(quote, 0.0) + cost - fee
+
+        order.update({
+            'status': 'closed', 'filled': amount, 'remaining': 0.0, 'average': price, 'cost': cost,
+            'price': order['price'] or price, 'lastTradeTimestamp': self._now(),
+            'fee': {'cost': fee, 'currency': quote},
+        })
+
+    def _get(self, id: str) -> dict:
+        order = self.orders.get(str(id))
+        if order is None:
+            raise ccxt.OrderNotFound(f"PaperExchange: ordem {id} não encontrada")
+        return order
+
+    @staticmethod
+    def _now() -> int:
+        return int(time.time() * 1000)
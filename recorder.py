@@ -0,0 +1,344 @@
+"""
+Gravador de dados de mercado.
+
+Persiste cada mensagem bruta do WebSocket da Binance (ticker, trade, kline, depth) junto com o
+timestamp de recebimento, para reproduzir exatamente o que o bot viu em uma operação.
+
+- A gravação é feita por uma thread em background: no caminho do WebSocket o custo é um único `put` na fila.
+- Os dados são gravados em Parquet (colunar, compressão zstd), um arquivo por hora numa pasta por dia, com um
+  row group por bloco.
+- O rodapé do Parquet só existe depois do fechamento. Por isso a hora em andamento é gravada num diário Arrow
+  (`.arrows`), um bloco por vez, com flush a cada bloco. Ao fechar a hora o diário é convertido em Parquet e
+  removido. Se o processo cair, o diário é convertido na próxima inicialização: perde-se no máximo um bloco
+  (`flush_interval`).
+- Cada pasta do dia tem um `index.jsonl` com o intervalo de tempo de cada arquivo e de cada row group,
+  permitindo ler só o necessário. Uma linha é acrescentada a cada arquivo fechado.
+
+Uso:
+    python recorder.py record --symbols xrpusdt,adausdt --streams ticker,trade,kline_1m,depth@100ms --out data
+    python recorder.py read --out data --start 2026-10-19T13:00 --end 2026-10-19T14:00
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+US_PER_HOUR = 3_600_000_000
+INDEX_FILE = 'index.jsonl'
+JOURNAL_SUFFIX = '.arrows'
+
+SCHEMA = pa.schema([
+    ('recv_ts', pa.int64()),                            # Timestamp de recebimento (microssegundos, UTC)
+    ('stream', pa.dictionary(pa.int32(), pa.string())),  # Ex.: xrpusdt@trade
+    ('payload', pa.string()),                           # Mensagem bruta (JSON) como recebida
+])
+
+
+class MarketRecorder:
+    """Grava mensagens do WebSocket em arquivos Parquet por hora, através de uma thread em background"""
+    def __init__(self, out_dir: str = 'data', chunk_rows: int = 100_000, flush_interval: float = 10.0,
+                 compression: str = 'zstd'):
+        self.out_dir = out_dir
+        self.chunk_rows = chunk_rows            # Linhas por row group
+        self.flush_interval = flush_interval    # Tempo máximo (s) que uma mensagem fica em memória
+        self.compression = compression
+
+        self.queue = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+
+        # Estado da thread de escrita
+        self._ts: List[int] = []
+        self._streams: List[str] = []
+        self._payloads: List[str] = []
+        self._last_flush = time.monotonic()
+        self._hour = None
+        self._sink: Optional[pa.OSFile] = None
+        self._journal: Optional[ipc.RecordBatchStreamWriter] = None
+        self._file_entry: Optional[dict] = None
+
+        os.makedirs(out_dir, exist_ok=True)
+
+    def start(self):
+        """Converte diários deixados por uma execução interrompida e inicia a thread de escrita"""
+        for journal_path in sorted(glob.glob(os.path.join(self.out_dir, '*', '*' + JOURNAL_SUFFIX))):
+            relative_path = os.path.relpath(journal_path, self.out_dir)[:-len(JOURNAL_SUFFIX)]
+            try:
+                self._finish_file(relative_path)
+                print(f"🩹 Diário recuperado: {relative_path}")
+            except Exception as e:
+                print(f"⚠️ Erro ao recuperar diário {journal_path}: {e}")
+
+        self.thread = threading.Thread(target=self._run, name='market-recorder', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Grava o que estiver pendente e fecha o arquivo atual"""
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def write(self, stream: str, payload: str, recv_ts: Optional[int] = None):
+        """Enfileira uma mensagem. Chamado no caminho do WebSocket, então não faz nada além do `put`."""
+        self.queue.put((recv_ts or time.time_ns() // 1000, stream, payload))
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush()
+                # Sem mensagens: fecha o arquivo quando a hora dele termina
+                if self._hour is not None and time.time_ns() // 1000 // US_PER_HOUR != self._hour:
+                    self._close_file()
+                continue
+
+            if item is None:
+                break
+
+            recv_ts, stream, payload = item
+
+            # Rotação a cada hora
+            hour = recv_ts // US_PER_HOUR
+            if hour != self._hour:
+                self._flush()
+                self._close_file()
+                self._hour = hour
+
+            self._ts.append(recv_ts)
+            self._streams.append(stream)
+            self._payloads.append(payload)
+
+            if len(self._ts) >= self.chunk_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+        self._flush()
+        self._close_file()
+
+    def _flush(self):
+        """Grava o bloco em memória no diário da hora (vira um row group do Parquet)"""
+        self._last_flush = time.monotonic()
+        if not self._ts:
+            return
+
+        try:
+            if self._journal is None:
+                self._open_file(self._ts[0])
+
+            table = pa.Table.from_arrays([
+                pa.array(self._ts, pa.int64()),
+                pa.array(self._streams, pa.string()).dictionary_encode(),
+                pa.array(self._payloads, pa.string()),
+            ], schema=SCHEMA)
+            self._journal.write_table(table, max_chunksize=len(self._ts))
+            self._sink.flush()
+
+            self._file_entry['row_groups'].append([self._ts[0], self._ts[-1], len(self._ts)])
+            self._file_entry['end'] = self._ts[-1]
+            self._file_entry['rows'] += len(self._ts)
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar dados de mercado: {e}")
+        finally:
+            self._ts, self._streams, self._payloads = [], [], []
+
+    def _open_file(self, first_ts: int):
+        hour_start = datetime.fromtimestamp(first_ts // US_PER_HOUR * 3600, tz=timezone.utc)
+        relative_path = os.path.join(hour_start.strftime('%Y-%m-%d'), f"{hour_start:%H}-{first_ts}.parquet")
+        path = os.path.join(self.out_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._sink = pa.OSFile(path + JOURNAL_SUFFIX, 'wb')
+        self._journal = ipc.new_stream(self._sink, SCHEMA)
+        self._file_entry = {'path': relative_path, 'start': first_ts, 'end': first_ts, 'rows': 0, 'row_groups': []}
+
+    def _close_file(self):
+        """Fecha o diário da hora, converte em Parquet e registra no índice do dia"""
+        self._hour = None
+        if self._journal is None:
+            return
+
+        relative_path = self._file_entry['path']
+        try:
+            self._journal.close()
+            self._sink.close()
+            self._finish_file(relative_path)
+        except Exception as e:
+            # O diário fica em disco e é convertido na próxima inicialização
+            print(f"⚠️ Erro ao fechar {relative_path}: {e}")
+        finally:
+            self._sink, self._journal, self._file_entry = None, None, None
+
+    def _finish_file(self, relative_path: str):
+        """Converte o diário em Parquet (um row group por bloco) e acrescenta a entrada no índice do dia"""
+        path = os.path.join(self.out_dir, relative_path)
+        entry = {'path': relative_path, 'start': None, 'end': None, 'rows': 0, 'row_groups': []}
+
+        writer = pq.ParquetWriter(path + '.tmp', SCHEMA, compression=self.compression, use_dictionary=['stream'])
+        with pa.OSFile(path + JOURNAL_SUFFIX) as source:
+            for batch in read_journal(source):
+                writer.write_batch(batch, row_group_size=batch.num_rows)
+                ts = batch.column('recv_ts')
+                first, last = ts[0].as_py(), ts[-1].as_py()
+                entry['row_groups'].append([first, last, batch.num_rows])
+                entry['start'] = first if entry['start'] is None else entry['start']
+                entry['end'] = last
+                entry['rows'] += batch.num_rows
+        writer.close()
+
+        if entry['rows']:
+            os.replace(path + '.tmp', path)
+            with open(os.path.join(os.path.dirname(path), INDEX_FILE), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        else:
+            os.remove(path + '.tmp')
+        os.remove(path + JOURNAL_SUFFIX)
+
+
+class MarketDataReader:
+    """Lê os dados gravados pelo MarketRecorder para um intervalo de tempo"""
+    def __init__(self, data_dir: str = 'data'):
+        self.data_dir = data_dir
+
+    def read(self, start: float, end: float, streams: Optional[List[str]] = None) -> pa.Table:
+        """
+        Retorna as mensagens com `start <= recv_ts < end` (timestamps em segundos).
+
+        Usa os índices dos dias do intervalo para abrir apenas os arquivos e row groups que o cobrem.
+        """
+        start_us, end_us = int(start * 1_000_000), int(end * 1_000_000)
+        tables = []
+
+        for entry in load_index(self.data_dir, start, end):
+            if entry['end'] < start_us or entry['start'] >= end_us:
+                continue
+
+            row_groups = [
+                i for i, (rg_start, rg_end, _) in enumerate(entry['row_groups'])
+                if rg_end >= start_us and rg_start < end_us
+            ]
+            parquet_file = pq.ParquetFile(os.path.join(self.data_dir, entry['path']))
+            tables.append(parquet_file.read_row_groups(row_groups, use_threads=True))
+
+        if not tables:
+            return SCHEMA.empty_table()
+
+        table = pa.concat_tables(tables)
+        mask = pc.and_(pc.greater_equal(table['recv_ts'], start_us), pc.less(table['recv_ts'], end_us))
+        if streams:
+            mask = pc.and_(mask, pc.is_in(table['stream'].cast(pa.string()), value_set=pa.array(streams)))
+
+        return table.filter(mask).sort_by('recv_ts')
+
+    def iter_messages(self, start: float, end: float, streams: Optional[List[str]] = None) -> Iterator[Tuple[int, str, str]]:
+        """Percorre as mensagens em ordem de recebimento como (recv_ts, stream, payload), para replay"""
+        table = self.read(start, end, streams)
+        for batch in table.to_batches():
+            recv_ts = batch.column('recv_ts').to_pylist()
+            stream = batch.column('stream').to_pylist()
+            payload = batch.column('payload').to_pylist()
+            yield from zip(recv_ts, stream, payload)
+
+
+def load_index(data_dir: str, start: float, end: float) -> list:
+    """Carrega as entradas dos índices diários que cobrem [start, end) (timestamps em segundos)"""
+    entries = {}
+    day = datetime.fromtimestamp(start, tz=timezone.utc).date()
+    last_day = datetime.fromtimestamp(end, tz=timezone.utc).date()
+    while day <= last_day:
+        try:
+            with open(os.path.join(data_dir, day.isoformat(), INDEX_FILE)) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Linha incompleta (queda durante a escrita)
+                    entries[entry['path']] = entry  # Um diário recuperado pode ter sido registrado duas vezes
+        except FileNotFoundError:
+            pass
+        day += timedelta(days=1)
+    return list(entries.values())
+
+
+def read_journal(source) -> Iterator[pa.RecordBatch]:
+    """Percorre os blocos de um diário Arrow, parando no último bloco completo"""
+    try:
+        reader = ipc.open_stream(source)
+    except (OSError, pa.ArrowInvalid):
+        return  # Diário vazio: o processo caiu antes do primeiro bloco
+    while True:
+        try:
+            yield reader.read_next_batch()
+        except StopIteration:
+            return
+        except (OSError, pa.ArrowInvalid):
+            return  # Bloco truncado: o processo caiu enquanto gravava
+
+
+def parse_time(value: str) -> float:
+    """Aceita epoch em segundos ou data ISO (UTC)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gravador de dados de mercado da Binance")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help="Grava os streams em disco")
+    record.add_argument('--symbols', required=True, help="Ex.: xrpusdt,adausdt")
+    record.add_argument('--streams', default='ticker,trade,kline_1m,depth@100ms')
+    record.add_argument('--out', default='data')
+
+    read = sub.add_parser('read', help="Mostra um resumo do intervalo gravado")
+    read.add_argument('--out', default='data')
+    read.add_argument('--start', required=True)
+    read.add_argument('--end', required=True)
+    read.add_argument('--streams', default=None)
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from scalpingv2 import BinanceWebSocket
+
+        symbols = [s.strip().lower().replace('/', '') for s in args.symbols.split(',')]
+        streams = [f"{symbol}@{name.strip()}" for symbol in symbols for name in args.streams.split(',')]
+
+        recorder = MarketRecorder(args.out).start()
+        print(f"🎙️ Gravando {len(streams)} streams em {args.out}")
+        try:
+            asyncio.run(BinanceWebSocket(symbols[0], recorder=recorder).record(streams))
+        except KeyboardInterrupt:
+            print("\n🛑 Encerrando gravação...")
+        finally:
+            recorder.stop()
+
+    else:
+        started = time.perf_counter()
+        streams = args.streams.split(',') if args.streams else None
+        table = MarketDataReader(args.out).read(parse_time(args.start), parse_time(args.end), streams)
+        elapsed = time.perf_counter() - started
+
+        print(f"📼 {table.num_rows} mensagens lidas em {elapsed:.2f}s")
+        if table.num_rows:
+            streams_table = pa.table({'stream': table['stream'].cast(pa.string()), 'recv_ts': table['recv_ts']})
+            counts = streams_table.group_by('stream').aggregate([('recv_ts', 'count')])
+            for stream, count in zip(counts['stream'].to_pylist(), counts['recv_ts_count'].to_pylist()):
+                print(f"  {stream}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+"""
+Análise de robustez dos parâmetros da estratégia sobre velas históricas.
+
+- Walk-forward: janelas móveis de treino/teste. Em cada treino, uma grade de parâmetros (TP em ATRs, SL em ATRs,
+  níveis de RSI) é testada de uma vez com o ShadowBook (uma variante por combinação, vetorizado em numpy); a
+  melhor combinação (PnL / drawdown) é aplicada na janela de teste seguinte e comparada com a configuração atual.
+- Monte Carlo: milhares de reamostragens (bootstrap) da sequência de trades, mantendo o número de trades por dia.
+  Cada trade é um retorno sobre o saldo, composto ao longo do caminho (o saldo não fica negativo), com os limites
+  diários do RiskEngine (`max_drawdown`, `daily_profit_target`) aplicados dia a dia. Estima as distribuições de
+  drawdown máximo (em $ e % do pico), de dias com limite de perda atingido, de resultado final e a chance de ruína.
+- Janelas e blocos de simulações rodam em paralelo num ProcessPoolExecutor.
+
+O stop é em ATRs (como em place_trade); a grade de `sl_atr` faz o papel do STOP_LOSS fixo.
+
+Uso:
+    python robustness.py --symbol XRP/USDT --timeframe 5m --days 120 --train-days 21 --test-days 7 --sims 10000
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scalpingv2 import MARKETS_CACHE_DIR, IndicatorState
+from scanner import TIMEFRAME_MS
+from shadow import ShadowBook, Variant
+
+TP_RATIOS = (1.5, 2.0, 2.5, 3.0)
+SL_ATRS = (0.75, 1.0, 1.5, 2.0)
+RSI_LEVELS = ((30, 70), (25, 75))
+MIN_TRAIN_TRADES = 10       # Combinações com menos trades no treino não são escolhidas
+INDICATOR_KEYS = ('RSI', 'ATR', 'MACD', 'Signal_Line', 'volume')
+
+
+def parameter_grid() -> List[Variant]:
+    """Grade de parâmetros; a primeira variante é a configuração atual do bot"""
+    live = Variant('live')
+    variants = [live]
+    for rsi_buy, rsi_sell in RSI_LEVELS:
+        for tp_ratio in TP_RATIOS:
+            for sl_atr in SL_ATRS:
+                if (rsi_buy, rsi_sell, tp_ratio, sl_atr) == (live.rsi_buy, live.rsi_sell, live.tp_ratio, live.sl_atr):
+                    continue
+                variants.append(Variant(
+                    f"rsi{rsi_buy}/{rsi_sell}_tp{tp_ratio:g}_sl{sl_atr:g}",
+                    rsi_buy=rsi_buy, rsi_sell=rsi_sell, tp_ratio=tp_ratio, sl_atr=sl_atr,
+                ))
+    return variants
+
+
+def variant_params(variant: Variant) -> dict:
+    return {'rsi_buy': variant.rsi_buy, 'rsi_sell': variant.rsi_sell, 'tp_ratio': variant.tp_ratio, 'sl_atr': variant.sl_atr}
+
+
+####### DADOS ##########################################################################
+def fetch_candles(symbol: str, timeframe: str, since_ms: int, until_ms: int) -> np.ndarray:
+    """Velas históricas via API pública (paginadas), com cache em disco"""
+    import ccxt
+
+    cache_path = os.path.join(
+        MARKETS_CACHE_DIR, f"candles-{symbol.replace('/', '')}-{timeframe}-{since_ms}-{until_ms}.npy"
+    )
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+
+    exchange = ccxt.binance({'enableRateLimit': True})
+    candles, since = [], since_ms
+    while since < until_ms:
+        batch = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=1000)
+        if not batch:
+            break
+        candles.extend(candle for candle in batch if candle[0] < until_ms)
+        since = batch[-1][0] + TIMEFRAME_MS[timeframe]
+
+    data = np.array(candles, dtype=float)
+    os.makedirs(MARKETS_CACHE_DIR, exist_ok=True)
+    np.save(cache_path, data)
+    return data
+
+
+def compute_indicators(candles: np.ndarray) -> np.ndarray:
+    """Indicadores de cada vela (N, 5), calculados uma vez para o histórico inteiro; NaN no aquecimento"""
+    state = IndicatorState()
+    rows = np.full((len(candles), len(INDICATOR_KEYS)), np.nan)
+    for i, candle in enumerate(candles.tolist()):
+        values = state.update(candle)
+        rows[i] = [np.nan if values[key] is None else values[key] for key in INDICATOR_KEYS]
+    return rows
+
+
+####### BACKTEST / WALK-FORWARD ########################################################
+def backtest(candles: np.ndarray, indicators: np.ndarray, variants: List[Variant], initial_balance: float,
+             risk_per_trade: float) -> dict:
+    """Roda todas as variantes sobre as velas de uma vez. Retorna métricas (K,) e os trades encerrados."""
+    book = ShadowBook(variants, initial_balance, risk_per_trade, record_trades=True)
+    for candle, row in zip(candles.tolist(), indicators.tolist()):
+        book.on_bar(candle, {key: None if value != value else value for key, value in zip(INDICATOR_KEYS, row)})
+
+    if book.trade_log:
+        timestamps = np.concatenate([np.full(len(closed), ts) for ts, closed, _ in book.trade_log])
+        variant_ids = np.concatenate([closed for _, closed, _ in book.trade_log])
+        returns = np.concatenate([returns for _, _, returns in book.trade_log])
+    else:
+        timestamps, variant_ids, returns = np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    return {
+        'pnl': book.realized + book.unrealized,
+        'max_drawdown': book.max_drawdown,
+        'trades': book.trades,
+        'timestamps': timestamps,
+        'variant_ids': variant_ids,
+        'returns': returns,
+    }
+
+
+def score(result: dict) -> np.ndarray:
+    """Critério de escolha no treino: PnL / drawdown máximo (combinações com poucos trades ficam de fora)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = result['pnl'] / np.maximum(result['max_drawdown'], 1e-9)
+    return np.where(result['trades'] >= MIN_TRAIN_TRADES, ratio, -np.inf)
+
+
+def walk_forward_window(task: dict) -> dict:
+    """Uma janela: otimiza a grade no treino e avalia a melhor combinação e a atual no teste"""
+    variants = parameter_grid()
+    train = backtest(task['train_candles'], task['train_indicators'], variants, task['initial_balance'], task['risk_per_trade'])
+    scores = score(train)
+    best = int(np.argmax(scores)) if np.isfinite(scores).any() else 0
+
+    test = backtest(task['test_candles'], task['test_indicators'], variants, task['initial_balance'], task['risk_per_trade'])
+
+    def trades_of(variant_id):
+        mask = test['variant_ids'] == variant_id
+        return test['timestamps'][mask].tolist(), test['returns'][mask].tolist()
+
+    best_ts, best_returns = trades_of(best)
+    live_ts, live_returns = trades_of(0)
+    return {
+        'train_start': int(task['train_candles'][0, 0]),
+        'test_start': int(task['test_candles'][0, 0]),
+        'test_end': int(task['test_candles'][-1, 0]),
+        'best': variants[best].name,
+        'best_params': variant_params(variants[best]),
+        'train_score': float(scores[best]),
+        'train_pnl_best': float(train['pnl'][best]),
+        'test_pnl_best': float(test['pnl'][best]),
+        'test_pnl_live': float(test['pnl'][0]),
+        'test_trades_best': int(test['trades'][best]),
+        'test_trades_live': int(test['trades'][0]),
+        'best_trades': [best_ts, best_returns],
+        'live_trades': [live_ts, live_returns],
+    }
+
+
+def walk_forward(candles: np.ndarray, indicators: np.ndarray, train_bars: int, test_bars: int, config: dict,
+                 pool: ProcessPoolExecutor) -> List[dict]:
+    tasks = []
+    for start in range(0, len(candles) - train_bars - test_bars + 1, test_bars):
+        train, test = slice(start, start + train_bars), slice(start + train_bars, start + train_bars + test_bars)
+        tasks.append({
+            'train_candles': candles[train], 'train_indicators': indicators[train],
+            'test_candles': candles[test], 'test_indicators': indicators[test],
+            'initial_balance': config['initial_balance'], 'risk_per_trade': config['risk_per_trade'],
+        })
+    return list(pool.map(walk_forward_window, tasks))
+
+
+####### MONTE CARLO ####################################################################
+def trades_per_day(timestamps: np.ndarray) -> np.ndarray:
+    """Quantidade de trades em cada dia (UTC) com trades, na ordem"""
+    _, counts = np.unique((np.asarray(timestamps) // 86400).astype(np.int64), return_counts=True)
+    return counts
+
+
+def monte_carlo_chunk(task: dict) -> Dict[str, np.ndarray]:
+    """
+    Um bloco de simulações: sorteia os retornos dos trades (com reposição) e compõe o saldo trade a trade
+    (saldo * (1 + retorno)), aplicando os limites diários como o RiskEngine: o dia para quando o PnL do dia chega
+    a -max_daily_loss, quando o drawdown do pico do dia chega a max_daily_loss ou quando a meta de lucro é
+    atingida. Um saldo zerado (ruína) não opera mais.
+    """
+    rng = np.random.default_rng(task['seed'])
+    counts = task['trades_per_day']
+    n_sims = task['n_sims']
+    balance = task['initial_balance']
+    max_daily_loss = balance * task['max_drawdown']
+    profit_target = balance * task['daily_profit_target']
+
+    # Fator de cada trade; uma perda maior que o saldo zera a conta (spot, sem dívida)
+    growth = np.maximum(1.0 + rng.choice(task['returns'], size=(n_sims, int(counts.sum()))), 0.0)
+
+    equity = np.full(n_sims, float(balance))
+    unguarded = equity.copy()
+    peak, peak_unguarded = equity.copy(), equity.copy()
+    drawdown, drawdown_pct = np.zeros(n_sims), np.zeros(n_sims)
+    drawdown_unguarded = np.zeros(n_sims)
+    loss_days = np.zeros(n_sims, dtype=np.int64)
+    profit_days = np.zeros(n_sims, dtype=np.int64)
+
+    trade = 0
+    for count in counts:
+        day_start = equity.copy()
+        day_peak = equity.copy()
+        active = equity > 0
+        for factor in growth[:, trade:trade + count].T:
+            # Trades depois do primeiro limite atingido no dia não acontecem
+            equity = np.where(active, equity * factor, equity)
+            unguarded *= factor
+
+            day_peak = np.maximum(day_peak, equity)
+            loss = (equity - day_start <= -max_daily_loss) | (day_peak - equity >= max_daily_loss)
+            profit = equity - day_start >= profit_target
+            loss_days += active & loss
+            profit_days += active & profit & ~loss
+            active &= ~(loss | profit) & (equity > 0)
+
+            peak = np.maximum(peak, equity)
+            drawdown = np.maximum(drawdown, peak - equity)
+            drawdown_pct = np.maximum(drawdown_pct, 1 - equity / peak)
+            peak_unguarded = np.maximum(peak_unguarded, unguarded)
+            drawdown_unguarded = np.maximum(drawdown_unguarded, peak_unguarded - unguarded)
+        trade += count
+
+    return {
+        'max_drawdown': drawdown,
+        'max_drawdown_pct': drawdown_pct * 100,
+        'max_drawdown_unguarded': drawdown_unguarded,
+        'final_pnl': equity - balance,
+        'ruined': equity <= 0,
+        'loss_days': loss_days,
+        'profit_days': profit_days,
+    }
+
+
+def monte_carlo(timestamps: List[float], returns: List[float], sims: int, config: dict, pool: ProcessPoolExecutor,
+                chunk: int = 1000, seed: int = 42) -> Optional[dict]:
+    if len(returns) < 2:
+        return None
+
+    counts = trades_per_day(np.array(timestamps))
+    base = {
+        'returns': np.array(returns), 'trades_per_day': counts, 'initial_balance': config['initial_balance'],
+        'max_drawdown': config['max_drawdown'], 'daily_profit_target': config['daily_profit_target'],
+    }
+    tasks = [dict(base, n_sims=min(chunk, sims - i), seed=seed + i) for i in range(0, sims, chunk)]
+    results = list(pool.map(monte_carlo_chunk, tasks))
+    merged = {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+    percentiles = (5, 50, 95, 99)
+
+    def dist(values):
+        return {f"p{p}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+
+    return {
+        'trades': len(returns),
+        'days': len(counts),
+        'sims': sims,
+        'max_drawdown': dist(merged['max_drawdown']),
+        'max_drawdown_pct': dist(merged['max_drawdown_pct']),
+        'max_drawdown_unguarded': dist(merged['max_drawdown_unguarded']),
+        'final_pnl': dist(merged['final_pnl']),
+        'prob_loss': float((merged['final_pnl'] < 0).mean()),
+        'prob_ruin': float(merged['ruined'].mean()),
+        'prob_loss_limit_day': float((merged['loss_days'] > 0).mean()),
+        'loss_limit_days': dist(merged['loss_days']),
+        'profit_target_days': dist(merged['profit_days']),
+    }
+
+
+####### RELATÓRIO ######################################################################
+def print_report(report: dict) -> None:
+    windows = report['walk_forward']
+    print(f"\n📊 Walk-forward: {len(windows)} janelas")
+    for window in windows:
+        when = time.strftime('%Y-%m-%d', time.gmtime(window['test_start'] / 1000))
+        print(
+            f"  {when} | melhor no treino: {window['best']:<24} | teste: ${window['test_pnl_best']:8.2f} "
+            f"({window['test_trades_best']} trades) vs atual ${window['test_pnl_live']:8.2f} ({window['test_trades_live']} trades)"
+        )
+    summary = report['walk_forward_summary']
+    print(f"  Total fora da amostra: otimizado ${summary['test_pnl_best']:.2f} vs atual ${summary['test_pnl_live']:.2f}")
+    print(f"  Parâmetros escolhidos: {summary['chosen']}")
+
+    for name, result in report['monte_carlo'].items():
+        if not result:
+            print(f"\n🎲 Monte Carlo ({name}): trades insuficientes")
+            continue
+        dd, dd_pct, final = result['max_drawdown'], result['max_drawdown_pct'], result['final_pnl']
+        print(f"\n🎲 Monte Carlo ({name}): {result['sims']} simulações de {result['trades']} trades em {result['days']} dias")
+        print(f"  Drawdown máximo: p50 ${dd['p50']:.2f} ({dd_pct['p50']:.1f}%) | p95 ${dd['p95']:.2f} ({dd_pct['p95']:.1f}%) | p99 ${dd['p99']:.2f} ({dd_pct['p99']:.1f}%)")
+        print(f"  Sem limites diários: p95 ${result['max_drawdown_unguarded']['p95']:.2f}")
+        print(f"  Resultado final: p5 ${final['p5']:.2f} | p50 ${final['p50']:.2f} | p95 ${final['p95']:.2f} | P(prejuízo) {result['prob_loss'] * 100:.1f}% | P(ruína) {result['prob_ruin'] * 100:.1f}%")
+        print(f"  Dias com limite de perda: p50 {result['loss_limit_days']['p50']:.0f} | p95 {result['loss_limit_days']['p95']:.0f} | P(≥1) {result['prob_loss_limit_day'] * 100:.1f}%")
+        print(f"  Dias com meta de lucro: p50 {result['profit_target_days']['p50']:.0f}")
+
+
+def main():
+    from recorder import parse_time
+
+    parser = argparse.ArgumentParser(description="Walk-forward e Monte Carlo dos parâmetros da estratégia")
+    parser.add_argument('--symbol', default='XRP/USDT')
+    parser.add_argument('--timeframe', default='5m', choices=sorted(TIMEFRAME_MS))
+    parser.add_argument('--days', type=float, default=120, help="Histórico total (dias) até hoje, se --inicio não for dado")
+    parser.add_argument('--inicio', default=None)
+    parser.add_argument('--fim', default=None)
+    parser.add_argument('--train-days', type=float, default=21)
+    parser.add_argument('--test-days', type=float, default=7)
+    parser.add_argument('--sims', type=int, default=10_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--initial-balance', type=float, default=40)
+    parser.add_argument('--risk-per-trade', type=float, default=0.25)
+    parser.add_argument('--max-drawdown', type=float, default=0.15)
+    parser.add_argument('--daily-profit-target', type=float, default=0.30)
+    parser.add_argument('--candles', default=None, help="Arquivo .npy com velas [ts, o, h, l, c, v] (em vez da API)")
+    parser.add_argument('--out', default='reports')
+    args = parser.parse_args()
+
+    config = {
+        'initial_balance': args.initial_balance,
+        'risk_per_trade': args.risk_per_trade,
+        'max_drawdown': args.max_drawdown,
+        'daily_profit_target': args.daily_profit_target,
+    }
+    started = time.perf_counter()
+
+    if args.candles:
+        candles = np.load(args.candles)
+    else:
+        until = int(parse_time(args.fim) * 1000) if args.fim else int(time.time() // 86400 * 86400 * 1000)
+        since = int(parse_time(args.inicio) * 1000) if args.inicio else until - int(args.days * 86400 * 1000)
+        candles = fetch_candles(args.symbol, args.timeframe, since, until)
+    indicators = compute_indicators(candles)
+    print(f"📚 {len(candles)} velas de {args.symbol} ({args.timeframe}) em {time.perf_counter() - started:.1f}s")
+
+    bars_per_day = 86_400_000 // TIMEFRAME_MS[args.timeframe]
+    train_bars, test_bars = int(args.train_days * bars_per_day), int(args.test_days * bars_per_day)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        windows = walk_forward(candles, indicators, train_bars, test_bars, config, pool)
+        print(f"📊 Walk-forward concluído em {time.perf_counter() - started:.1f}s")
+
+        full = backtest(candles, indicators, parameter_grid()[:1], args.initial_balance, args.risk_per_trade)
+        oos_ts = [ts for window in windows for ts in window['best_trades'][0]]
+        oos_returns = [r for window in windows for r in window['best_trades'][1]]
+
+        report = {
+            'symbol': args.symbol,
+            'timeframe': args.timeframe,
+            'candles': len(candles),
+            'config': config,
+            'walk_forward': windows,
+            'walk_forward_summary': {
+                'test_pnl_best': sum(window['test_pnl_best'] for window in windows),
+                'test_pnl_live': sum(window['test_pnl_live'] for window in windows),
+                'chosen': {name: [window['best'] for window in windows].count(name) for name in {window['best'] for window in windows}},
+            },
+            'monte_carlo': {
+                'configuração atual': monte_carlo(full['timestamps'].tolist(), full['returns'].tolist(), args.sims, config, pool),
+                'walk-forward (fora da amostra)': monte_carlo(oos_ts, oos_returns, args.sims, config, pool),
+            },
+        }
+
+    print_report(report)
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"robustness-{args.symbol.replace('/', '')}-{int(time.time())}.json")
+    for window in report['walk_forward']:
+        window.pop('best_trades')
+        window.pop('live_trades')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Relatório salvo em {path} ({time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,12 @@ import asyncio
 import json
 import threading
 import websockets
-import ccxt
 import time
 import os
-import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from event_log import EventLog, WARNING, DEBUG, get_event_log
 import telebot
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
@@ -15,12 +17,10 @@ load_dotenv()
 
 API_KEY = os.getenv("API_KEY")
 API_SECRET = os.getenv("API_SECRET")
-API_KEY_TESTNET = os.getenv("API_KEY_TESTNET")
-API_SECRET_TESTNET = os.getenv("API_SECRET_TESTNET")
-URL_API_TESTNET = os.getenv("URL_API_TESTNET")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 BINANCE_WS_URL = os.getenv("BINANCE_WS_URL")
+MARKETS_CACHE_DIR = os.getenv("MARKETS_CACHE_DIR", ".cache")
 
 # Configurações
 SIMULATION_MODE = False  # Ativa o modo simulado
@@ -28,20 +28,376 @@ MIN_VOLUME_THRESHOLD = 50000 # Volume mínimo para operar -> 50k
 TAKE_PROFIT = 1.021
 STOP_LOSS = 0.99
 BREAK_EVEN_TRIGGER = 1.007
+TRAILING_STOP_PERCENT = 0.005  # Trailing stop a 0.5% do melhor preço (ativo após o break-even)
+ATR_STEP_MULTIPLIER = 1.0  # Sobe o stop 1 ATR a cada 1 ATR a favor (0 desativa)
+STOP_MIN_STEP = 0.001  # Só atualiza o stop na exchange se ele andar pelo menos 0.1% do preço de entrada
 TAKE_PROFIT_RATIO = 2.0  # Risco:Recompensa de 2:1
 RISK_PER_TRADE = 0.05  # Risco de 5% da banca por operação
-PAR_SYMBOL, QUANTIDADE_OPERACAO = "XRP/USDT", 5 # 5 itens
-# PAR_SYMBOL, QUANTIDADE_OPERACAO = "ADA/USDT", 10 # 10
+CLOSE_RETRIES = 3  # Tentativas da ordem a mercado ao fechar a posição num limite de risco
+CLOSE_RETRY_DELAY = 1.0  # Espera (s) entre as tentativas
+PAR_SYMBOL = "XRP/USDT"
+# PAR_SYMBOL = "ADA/USDT"
+MARKETS_CACHE_TTL = 24 * 3600  # Validade do cache de mercados em disco (segundos)
+SCANNER_ENABLED = False  # Roda o scanner de todos os pares USDT junto com o bot (ranking em /scanner)
+SHADOW_ENABLED = False  # Avalia variantes da estratégia em paralelo, sem ordens (resultado em /sombra)
+CANDLE_TIMEFRAME = '5m'  # Timeframe dos indicadores (fetch_ohlcv e stream de kline)
+MARKET_RECORDER_DIR = os.getenv("MARKET_RECORDER_DIR")  # Se definido, grava as mensagens do WebSocket do bot (ver recorder.py)
+
+
+def create_exchange(simulation_mode: bool, paper_balances: Optional[Dict[str, float]] = None):
+    """Cria o cliente ccxt da Binance (no modo simulação, uma PaperExchange local sem credenciais)"""
+    import ccxt  # Import pesado: carregado aqui para rodar em paralelo com o WebSocket e o Telegram
+
+    if simulation_mode:
+        from paper_exchange import PaperExchange
+        return PaperExchange(balances=paper_balances)
+
+    exchange_config = {
+        'apiKey': API_KEY,
+        'secret': API_SECRET,
+        'options': {
+            'defaultType': 'spot',
+            'adjustForTimeDifference': True,
+        },
+        'enableRateLimit': True,
+    }
+
+    return ccxt.binance(exchange_config)
+
+
+@contextmanager
+def timed(timings: Dict[str, float], name: str):
+    """Registra em `timings[name]` quanto tempo o bloco levou (segundos)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+def cancel_replace_result(error: Exception) -> Optional[Dict[str, Any]]:
+    """
+    Extrai o resultado de um `order.cancelReplace` que falhou (corpo JSON da resposta da Binance no erro do ccxt).
+
+    Ex.: HTTP 409 {"code": -2021, "data": {"cancelResult": "SUCCESS", "newOrderResult": "FAILURE", ...}}
+    Retorna o `data` ou None se o erro não trouxer esse corpo.
+    """
+    message = str(error)
+    start = message.find('{')
+    if start < 0:
+        return None
+    try:
+        body = json.loads(message[start:])
+    except ValueError:
+        return None
+    data = body.get('data') if isinstance(body, dict) else None
+    return data if isinstance(data, dict) and 'cancelResult' in data else None
+
+
+class StopManager:
+    """
+    Controla o nível do stop loss localmente para a posição ativa.
+
+    A cada evento de preço avalia, em O(1), as regras de break-even, trailing stop e degrau de ATR.
+    O stop só anda a favor da posição e a exchange só é acionada quando o nível muda de fato
+    (ver `pending()`), evitando cancelar/recriar a ordem de SL a cada tick.
+    """
+    def __init__(self, side: str, entry_price: float, stop_price: float, atr: float,
+                 break_even_trigger: float = BREAK_EVEN_TRIGGER, trailing_percent: float = TRAILING_STOP_PERCENT,
+                 atr_step: float = ATR_STEP_MULTIPLIER, min_step: float = STOP_MIN_STEP):
+        self.side = side
+        self.entry_price = entry_price
+        self.initial_stop = stop_price
+        self.stop_price = stop_price    # Nível desejado (local)
+        self.sent_price = stop_price    # Nível da ordem que está na exchange
+        self.best_price = entry_price   # Melhor preço desde a entrada (máxima p/ compra, mínima p/ venda)
+        self.break_even_done = False
+
+        # Pré-calcula os limites para manter o on_price em O(1)
+        self.direction = 1 if side == 'buy' else -1
+        self.break_even_price = entry_price * (break_even_trigger if side == 'buy' else 2 - break_even_trigger)
+        self.trailing_percent = trailing_percent
+        self.atr_step = atr * atr_step if atr and atr_step else 0
+        self.min_move = entry_price * min_step
+
+    def on_price(self, price: float) -> bool:
+        """Atualiza o nível do stop com o novo preço. Retorna True se o nível mudou."""
+        d = self.direction
+
+        # Só recalcula quando o preço faz um novo extremo a favor da posição
+        if (price - self.best_price) * d <= 0:
+            return False
+        self.best_price = price
+
+        candidate = self.stop_price
+
+        # Break-even: trava o stop no preço de entrada
+        if not self.break_even_done and (price - self.break_even_price) * d >= 0:
+            self.break_even_done = True
+            candidate = self._better(candidate, self.entry_price)
+
+        # Trailing stop: acompanha o melhor preço depois do break-even
+        if self.break_even_done and self.trailing_percent:
+            candidate = self._better(candidate, price * (1 - d * self.trailing_percent))
+
+        # Degrau de ATR: a cada `atr_step` a favor, o stop anda `atr_step`
+        if self.atr_step:
+            steps = int((price - self.entry_price) * d // self.atr_step)
+            if steps > 0:
+                candidate = self._better(candidate, self.initial_stop + d * steps * self.atr_step)
+
+        if (candidate - self.stop_price) * d < self.min_move:
+            return False
+
+        self.stop_price = candidate
+        return True
+
+    def pending(self) -> bool:
+        """Indica se o nível local ainda não foi enviado para a exchange"""
+        return self.stop_price != self.sent_price
+
+    def _better(self, a: float, b: float) -> float:
+        """Retorna o stop mais favorável para o lado da posição"""
+        return max(a, b) if self.direction == 1 else min(a, b)
+
+
+class IndicatorState:
+    """
+    Indicadores de `get_indicators` calculados de forma incremental, vela a vela, em O(1).
+
+    RSI e ATR usam as mesmas janelas móveis da versão em pandas. EMA/MACD usam todo o histórico recebido,
+    então podem diferir da versão em pandas, que recalcula a partir de apenas `period + 1` velas.
+    """
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.gains = deque(maxlen=period)
+        self.losses = deque(maxlen=period)
+        self.ranges = deque(maxlen=period)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.range_sum = 0.0
+
+        self.prev_close = None
+        self.volume = None
+        self.ema9 = None
+        self.ema_fast = None
+        self.ema_slow = None
+        self.signal_line = None
+
+    def update(self, candle) -> Dict[str, Any]:
+        """Adiciona uma vela [timestamp, open, high, low, close, volume] e retorna os indicadores atualizados"""
+        _, _, high, low, close, volume = candle
+        self.volume = volume
+
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.gain_sum += self._push(self.gains, max(delta, 0.0))
+            self.loss_sum += self._push(self.losses, max(-delta, 0.0))
+        self.prev_close = close
+
+        self.range_sum += self._push(self.ranges, high - low)
+
+        self.ema9 = self._ema(self.ema9, close, 9)
+        self.ema_fast = self._ema(self.ema_fast, close, 12)
+        self.ema_slow = self._ema(self.ema_slow, close, 26)
+        self.signal_line = self._ema(self.signal_line, self.ema_fast - self.ema_slow, 9)
+
+        return self.values()
+
+    @classmethod
+    def from_candles(cls, candles, period: int = 14) -> 'IndicatorState':
+        """Cria o estado a partir de uma lista de velas (mesmo resultado da versão em pandas para as mesmas velas)"""
+        state = cls(period)
+        for candle in candles:
+            state.update(candle)
+        return state
+
+    def values(self) -> Dict[str, Any]:
+        """Retorna os indicadores no mesmo formato de `TradingBot.get_indicators`"""
+        rsi = atr = None
+
+        if len(self.gains) == self.period:
+            if self.loss_sum > 0:
+                rsi = 100 - (100 / (1 + self.gain_sum / self.loss_sum))
+            elif self.gain_sum > 0:
+                rsi = 100.0
+
+        if len(self.ranges) == self.period:
+            atr = self.range_sum / self.period
+
+        return {
+            'RSI': rsi,
+            'ATR': atr,
+            'MACD': self.ema_fast - self.ema_slow if self.ema_fast is not None else None,
+            'Signal_Line': self.signal_line,
+            'volume': self.volume,
+        }
+
+    @staticmethod
+    def _push(window: deque, value: float) -> float:
+        """Adiciona o valor na janela e retorna a variação da soma"""
+        removed = window[0] if len(window) == window.maxlen else 0.0
+        window.append(value)
+        return value - removed
+
+    @staticmethod
+    def _ema(previous: Optional[float], value: float, span: int) -> float:
+        if previous is None:
+            return value
+        alpha = 2 / (span + 1)
+        return alpha * value + (1 - alpha) * previous
+
+
+class RiskEngine:
+    """
+    Marca as posições a mercado a cada evento de preço e aplica os limites de risco do dia.
+
+    Mantém somatórios de PnL não realizado e exposição; a cada preço atualiza apenas a contribuição
+    do símbolo que mudou, então o custo por tick é O(1) independente do número de símbolos.
+    Pode ser compartilhado entre vários TradingBot da mesma conta. Os preços chegam pelo WebSocket e os
+    resultados realizados pelo loop do bot (às vezes numa thread), então as atualizações usam um lock.
+    """
+    def __init__(self, initial_balance: float, risk_per_trade: float = 0.02, max_drawdown: float = 0.1, daily_profit_target: float = 0.3):
+        self.initial_balance = initial_balance
+        self.balance = initial_balance      # Saldo em cache (atualizado no início e a cada resultado realizado)
+        self.risk_per_trade = risk_per_trade
+        self.max_daily_loss = initial_balance * max_drawdown
+        self.daily_profit_target = initial_balance * daily_profit_target
+
+        # symbol -> [direção (1/-1), preço de entrada, quantidade, PnL não realizado, exposição]
+        self.positions: Dict[str, list] = {}
+        self.realized_pnl = 0.0
+        self.unrealized_pnl = 0.0
+        self.exposure = 0.0
+        self.peak_pnl = 0.0
+        self.drawdown = 0.0                 # Queda do pico de PnL intradiário até agora (USD)
+        self.halted: Optional[str] = None   # Motivo da parada (None enquanto pode operar)
+        self.next_reset = self._next_day()
+        self.lock = threading.RLock()
+
+    def on_price(self, symbol: str, price: float) -> Optional[str]:
+        """Marca a posição do símbolo a mercado. Retorna o motivo se um limite for atingido neste tick."""
+        with self.lock:
+            if time.time() >= self.next_reset:
+                self.reset_day()
+
+            position = self.positions.get(symbol)
+            if position is None:
+                return None
+
+            direction, entry_price, size, unrealized, exposure = position
+            new_unrealized = (price - entry_price) * size * direction
+            new_exposure = price * size
+            self.unrealized_pnl += new_unrealized - unrealized
+            self.exposure += new_exposure - exposure
+            position[3], position[4] = new_unrealized, new_exposure
+
+            return self._check_limits()
+
+    def open_position(self, symbol: str, side: str, entry_price: float, size: float) -> None:
+        with self.lock:
+            self.remove_position(symbol)
+            self.positions[symbol] = [1 if side == 'buy' else -1, entry_price, size, 0.0, entry_price * size]
+            self.exposure += entry_price * size
+
+    def realize(self, symbol: str, pnl: float) -> Optional[str]:
+        """Registra o resultado de uma posição encerrada"""
+        with self.lock:
+            self.remove_position(symbol)
+            self.realized_pnl += pnl
+            self.balance += pnl
+
+            if self.halted is None and self.realized_pnl >= self.daily_profit_target:
+                self.halted = 'profit'
+                return self.halted
+            return self._check_limits()
+
+    def update_totals(self, realized_pnl: float, unrealized_pnl: float, exposure: float) -> Optional[str]:
+        """
+        Substitui os somatórios por valores agregados de fora (ex.: coordenador do cluster somando os workers)
+        e aplica os limites. Retorna o motivo se um limite for atingido nesta atualização.
+        """
+        with self.lock:
+            if time.time() >= self.next_reset:
+                self.reset_day()
+
+            self.realized_pnl = realized_pnl
+            self.unrealized_pnl = unrealized_pnl
+            self.exposure = exposure
+
+            if self.halted is None and self.realized_pnl >= self.daily_profit_target:
+                self.halted = 'profit'
+                return self.halted
+            return self._check_limits()
+
+    def remove_position(self, symbol: str) -> None:
+        with self.lock:
+            position = self.positions.pop(symbol, None)
+            if position:
+                self.unrealized_pnl -= position[3]
+                self.exposure -= position[4]
+
+    def size_for(self, price: float, atr: float) -> float:
+        """
+        Quantidade para arriscar `risk_per_trade` do saldo com o stop a 1 ATR da entrada (como em place_trade),
+        limitada ao saldo disponível (spot, sem alavancagem).
+        """
+        if not price or not atr or self.balance <= 0:
+            return 0.0
+        size = self.balance * self.risk_per_trade / atr
+        return min(size, self.balance / price)
+
+    def daily_pnl(self) -> float:
+        """PnL do dia: realizado + não realizado"""
+        return self.realized_pnl + self.unrealized_pnl
+
+    def reset_day(self) -> None:
+        with self.lock:
+            self.realized_pnl = 0.0
+            self.peak_pnl = self.unrealized_pnl
+            self.drawdown = 0.0
+            self.halted = None
+            self.next_reset = self._next_day()
+
+    def _check_limits(self) -> Optional[str]:
+        if self.halted:
+            return None
+
+        pnl = self.realized_pnl + self.unrealized_pnl
+        if pnl > self.peak_pnl:
+            self.peak_pnl = pnl
+        self.drawdown = self.peak_pnl - pnl
+
+        if pnl <= -self.max_daily_loss:
+            self.halted = 'loss'
+        elif self.drawdown >= self.max_daily_loss:
+            self.halted = 'drawdown'
+        return self.halted
+
+    @staticmethod
+    def _next_day() -> float:
+        """Próxima meia-noite UTC (epoch em segundos)"""
+        return (time.time() // 86400 + 1) * 86400
 
 
 class TradingBot:
-    def __init__(self, symbol: str, initial_balance: float, websocket_client, risk_per_trade: float = 0.02, max_drawdown: float = 0.1, daily_profit_target: float = 0.3, simulation_mode: bool = True):
+    def __init__(self, symbol: str, initial_balance: float, websocket_client, risk_per_trade: float = 0.02, max_drawdown: float = 0.1, daily_profit_target: float = 0.3, simulation_mode: bool = True, risk_engine: Optional[RiskEngine] = None,
+                 exchange=None, telegram_commands: bool = True, scanner=None, event_log: Optional[EventLog] = None, shadow=None):
         self.symbol = symbol            # Símbolo do par de trading
         self.active_position: Optional[Dict[str, Any]] = None   # Posição ativa (None se não houver)
         
         self.ws = websocket_client  # Instância do WebSocket
         self.bot_running = False    # Iniciar o bot desligado
         self.simulation_mode = simulation_mode      # Modo de simulação
+        self.exchange = exchange    # Cliente já configurado (opcional, ex.: RemoteExchange no modo multiprocesso)
+        self.telegram_commands = telegram_commands  # Se False, só envia mensagens (sem polling de comandos)
+        self.paper_exchange = None  # PaperExchange local do modo simulação (recebe os preços do WebSocket)
+        self.scanner = scanner      # MarketScanner opcional (ranking de pares para o /scanner)
+        self.log = event_log or get_event_log()  # Log de eventos (só enfileira; a escrita é em background)
+        self.shadow = shadow        # ShadowBook opcional: variantes avaliadas junto, só observando (sem ordens)
+        self.shadow_candles = deque(maxlen=15)  # Janela do modo sombra: as mesmas velas do get_indicators (limit=period+1)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None   # Loop do `run()`
+        self.wakeup: Optional[asyncio.Event] = None             # Acorda o `run()` antes do próximo segundo
 
         """
         Gerenciamento de Risco
@@ -60,44 +416,109 @@ class TradingBot:
         self.max_daily_loss = self.initial_balance * self.max_drawdown  # Perda máxima em USD
         self.daily_profit_target = self.initial_balance * daily_profit_target  # Meta de lucro diária em USD
 
-        self.setup_exchange()
-        self.setup_telegram()
+        # Marca a posição a mercado a cada preço e aplica os limites (pode ser compartilhado entre bots)
+        self.risk = risk_engine or RiskEngine(initial_balance, risk_per_trade, max_drawdown, daily_profit_target)
+
+        # Exchange e Telegram são inicializados em paralelo
+        self.startup_timings: Dict[str, float] = {}
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            exchange_setup = pool.submit(self.setup_exchange) if self.exchange is None else None
+            telegram_setup = pool.submit(self.setup_telegram)
+            if exchange_setup:
+                exchange_setup.result()
+            telegram_setup.result()
+
+        # Recebe cada preço do WebSocket para atualizar o stop e o risco localmente
+        self.ws.add_listener(self.on_paper_price)
+        self.ws.add_listener(self.on_price)
+        if hasattr(self.ws, 'add_candle_listener'):  # O SharedPriceFeed (multiprocesso) não tem stream de velas
+            self.ws.add_candle_listener(self.on_candle)
     
     def setup_exchange(self):
         try:
-            api_key = API_KEY_TESTNET if self.simulation_mode else API_KEY
-            api_secret = API_SECRET_TESTNET if self.simulation_mode else API_SECRET
-            
-            exchange_config = {
-                'apiKey': api_key,
-                'secret': api_secret,
-                'options': {
-                    'defaultType': 'spot',
-                    'adjustForTimeDifference': True,
-                },
-                'enableRateLimit': True,
-            }
+            with timed(self.startup_timings, 'exchange'):
+                self.exchange = create_exchange(self.simulation_mode, {'USDT': self.initial_balance})
+                self.paper_exchange = self.exchange if self.simulation_mode else None
 
-            if self.simulation_mode:
-                exchange_config['urls'] = {'api': URL_API_TESTNET}
-            
-            self.exchange = ccxt.binance(exchange_config)
+            # fetch_balance depende dos mercados carregados; com cache eles vêm do disco
+            self.load_markets_cached()
 
-            if self.simulation_mode:
-                self.exchange.set_sandbox_mode(True)
+            with timed(self.startup_timings, 'saldo'):
+                balance = self.exchange.fetch_balance()
 
-            self.exchange.fetch_balance()
-            print(f"🚀 Conexão estabelecida com {'testnet' if self.simulation_mode else 'produção'}")
+            # Saldo em cache usado no dimensionamento das ordens (limitado à banca definida para o bot)
+            usdt_balance = balance.get('USDT', {}).get('free') or 0
+            if usdt_balance > 0:
+                self.risk.balance = min(self.risk.balance, float(usdt_balance))
+            print(f"🚀 Conexão estabelecida com {'paper trading' if self.simulation_mode else 'produção'}")
 
         except Exception as e:
             error_msg = f"Erro ao configurar exchange: {e}"
             # self.logger.error(error_msg)
             raise Exception(error_msg)
      
+    def load_markets_cached(self) -> None:
+        """
+        Carrega os metadados de mercado (`load_markets`) a partir de um cache em disco.
+
+        O cache é usado se tiver menos de `MARKETS_CACHE_TTL` e contiver o símbolo operado. Em paralelo à
+        sincronização do relógio, uma consulta leve de exchangeInfo (só do símbolo operado) confere se os
+        filtros mudaram; se mudaram, os mercados são recarregados da exchange e o cache é reescrito.
+        """
+        cache_path = os.path.join(MARKETS_CACHE_DIR, "markets-prod.json")  # A PaperExchange usa os mercados de produção
+
+        with timed(self.startup_timings, 'mercados (cache)'):
+            cache = None
+            try:
+                if time.time() - os.path.getmtime(cache_path) < MARKETS_CACHE_TTL:
+                    with open(cache_path) as f:
+                        cache = json.load(f)
+                    if self.symbol not in cache['markets']:
+                        cache = None
+            except (OSError, ValueError, KeyError):
+                cache = None
+
+        if cache:
+            self.exchange.set_markets(cache['markets'], cache.get('currencies'))
+
+            with timed(self.startup_timings, 'validação do cache + relógio'), ThreadPoolExecutor(max_workers=2) as pool:
+                fresh = pool.submit(self._markets_fresh, cache['markets'][self.symbol])
+                clock = pool.submit(self.exchange.load_time_difference)
+                clock.result()
+                if fresh.result():
+                    return
+            print("♻️ Cache de mercados desatualizado, recarregando...")
+
+        with timed(self.startup_timings, 'mercados (rede)'):
+            self.exchange.load_markets(reload=True)
+
+        try:
+            os.makedirs(MARKETS_CACHE_DIR, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'markets': self.exchange.markets, 'currencies': self.exchange.currencies}, f)
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ Não foi possível salvar o cache de mercados: {e}")
+
+    def _markets_fresh(self, cached_market: Dict[str, Any]) -> bool:
+        """Compara status e filtros do símbolo operado com os da exchange (exchangeInfo de um único símbolo)"""
+        try:
+            response = self.exchange.public_get_exchangeinfo({'symbol': cached_market['id']})
+            live = response['symbols'][0]
+            return live['status'] == cached_market['info']['status'] and live['filters'] == cached_market['info']['filters']
+        except Exception as e:
+            print(f"⚠️ Erro ao validar cache de mercados: {e}")
+            return False
+
     ####### START - TELEGRAM BOT CONFIG ####################################################
     def setup_telegram(self):
         """Configura o bot do Telegram com botões"""
         self.telegram_bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+
+        # Vários bots com o mesmo token não podem fazer polling ao mesmo tempo
+        if not self.telegram_commands:
+            return
         
         # Cria o teclado com botões
         self.keyboard = ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
@@ -108,6 +529,7 @@ class TradingBot:
             KeyboardButton('/status'),
             KeyboardButton('/posicao'),
             KeyboardButton('/resultados_do_dia'),
+            KeyboardButton('/scanner'),
             # KeyboardButton('/trocar_par'),
             KeyboardButton('/ajuda'),
             KeyboardButton('/cancelar_ordens'),
@@ -134,7 +556,17 @@ class TradingBot:
         
         @self.telegram_bot.message_handler(commands=['simulation'])
         def toggle_simulation(message):
+            if self.active_position or self.check_active_orders():
+                self.send_telegram_message("❌ Feche a posição e as ordens abertas antes de trocar o modo")
+                return
+
             self.simulation_mode = not self.simulation_mode
+            try:
+                self.setup_exchange()
+            except Exception as e:
+                self.simulation_mode = not self.simulation_mode
+                self.send_telegram_message(f"❌ {e}")
+                return
             self.send_telegram_message(f"Modo simulação: {'✅' if self.simulation_mode else '❌'}")
         
         @self.telegram_bot.message_handler(commands=['cancelar_ordens'])
@@ -193,16 +625,32 @@ class TradingBot:
                     return
                     
                 new_symbol = parts[1].upper()
-                # Valida se o par existe
-                try:
-                    self.exchange.fetch_ticker(new_symbol)
-                    self.change_symbol(new_symbol)
-                except Exception as e:
+                # Valida se o par existe nos mercados já carregados (sem REST)
+                market = self.exchange.markets.get(new_symbol)
+                if not market or not market.get('active') or not market.get('spot'):
                     self.send_telegram_message(f"❌ Par inválido ou não suportado: {new_symbol}")
+                    return
+
+                self.change_symbol(new_symbol)
                     
             except Exception as e:
                 self.send_telegram_message(f"❌ Erro ao processar comando: {e}")
                 
+        @self.telegram_bot.message_handler(commands=['scanner'])
+        def get_scanner(message):
+            if not self.scanner:
+                self.send_telegram_message("🔭 Scanner desativado (SCANNER_ENABLED)")
+                return
+            from scanner import format_ranking
+            self.send_telegram_message(format_ranking(self.scanner.top(10)))
+
+        @self.telegram_bot.message_handler(commands=['sombra'])
+        def get_shadow(message):
+            if not self.shadow:
+                self.send_telegram_message("👥 Modo sombra desativado (SHADOW_ENABLED)")
+                return
+            self.send_telegram_message(self.shadow.format_summary())
+
         @self.telegram_bot.message_handler(commands=['ajuda'])
         def send_help(message):
             help_text = """
@@ -214,6 +662,8 @@ class TradingBot:
             /status - Mostra status atual do bot
             /posicao - Mostra detalhes da posição atual
             /resultados_do_dia - Mostra o PNL do dia
+            /scanner - Mostra os pares com sinal no fechamento da última barra
+            /sombra - Mostra o resultado das variantes da estratégia (modo sombra)
             /trocar_par SYMBOL/USDT - Troca o par de trading (ex: /trocar_par BTC/USDT)
             /ajuda - Mostra esta mensagem
             """
@@ -243,6 +693,9 @@ class TradingBot:
             Modo simulação: {'✅' if self.simulation_mode else '❌'}
             Bot ativo: {'✅' if self.bot_running else '❌'}
             PNL Diário: ${self.daily_pnl:.2f}
+            PNL não realizado: ${self.risk.unrealized_pnl:.2f}
+            Drawdown do dia: ${self.risk.drawdown:.2f}
+            Exposição: ${self.risk.exposure:.2f}
             """
             
             self.send_telegram_message(status)
@@ -323,6 +776,8 @@ class TradingBot:
             # url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
             # payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message}
             # requests.post(url, data=payload)
+            if self.simulation_mode:
+                message = f"[SIMULAÇÃO] {message}"
             self.telegram_bot.send_message(TELEGRAM_CHAT_ID, message)  # Usando o bot do Telegram
         except Exception as e:
             print(f"Erro ao enviar mensagem Telegram: {e}")
@@ -344,6 +799,8 @@ class TradingBot:
             
             # Atualiza o WebSocket
             self.ws.change_symbol(new_symbol.lower().replace("/", ""))
+            if self.shadow:
+                self.seed_shadow()
             
             # Restaura o estado do bot
             self.bot_running = was_running
@@ -357,72 +814,124 @@ class TradingBot:
 
     ####### END - TELEGRAM BOT CONFIG ####################################################
 
-    ####### START - TENTATIVA GESTÃO DE RISCO CONFIG ######################################
-    # def calculate_trade_size(self):
-    #     balance = self.exchange.fetch_balance().get('USDT', {}).get('free', 0)
-    #     risk_amount = balance * RISK_PER_TRADE
-    #     last_price = self.ws.get_price()
-    #     trade_size = risk_amount / last_price if last_price else 0
-    #     return max(trade_size, 0.1)
-
-    def calculate_trade_size(self):
-        """Calcula o tamanho da ordem com base no risco e no saldo disponível"""
-        # Obtém o saldo de USDT e outras moedas
-        balance = self.exchange.fetch_balance()
-
-        usdt_balance = balance.get('USDT', {}).get('free', 0)
-        xrp_balance = balance.get('XRP', {}).get('free', 0)
-        
-        # Imprime os saldos para debug
-        print(f"Saldo USDT disponível: {usdt_balance}")
-        print(f"Saldo XRP disponível: {xrp_balance}")
-        
-        # Caso o saldo de USDT seja suficiente, use-o
-        if usdt_balance > 0:
-            available_balance = usdt_balance
-        else:
-            # Se não houver USDT suficiente, use o saldo de XRP
-            price_xrp = self.ws.get_price()  # Preço atual do XRP
-            available_balance = xrp_balance * price_xrp  # Converte o XRP para USDT
-
-        # Calcula o risco baseado no saldo disponível
-        risk_amount = available_balance * RISK_PER_TRADE
-        last_price = self.ws.get_price()
-
-        if last_price is None:
-            return 0  # Retorna 0 se o preço não for obtido
+    ####### START - GESTÃO DE RISCO ######################################################
+    def calculate_trade_size(self, price: float, atr: float) -> float:
+        """
+        Calcula o tamanho da ordem pelo ATR e `risk_per_trade`, usando o saldo em cache do RiskEngine.
 
-        # Calcula o tamanho da ordem baseado no risco e preço atual
-        trade_size = risk_amount / last_price
+        Não faz chamadas REST: os limites do mercado vêm dos mercados já carregados.
+        Retorna 0 se a ordem ficar abaixo do mínimo permitido pela Binance.
+        """
+        trade_size = self.risk.size_for(price, atr)
+        if not trade_size:
+            return 0
 
-        # Verifica o valor mínimo de transação permitido pela Binance
-        market = self.exchange.market(self.symbol)
-        min_notional = market['limits']['cost']['min']
+        limits = self.exchange.market(self.symbol)['limits']
+        min_notional = limits['cost']['min'] or 0
+        min_amount = limits['amount']['min'] or 0
 
-        # Calcula o valor total da transação
-        total_value = trade_size * last_price
+        if trade_size * price < min_notional or trade_size < min_amount:
+            return 0
 
-        # Ajusta o tamanho da ordem para garantir que atenda ao valor mínimo
-        if total_value < min_notional:
-            # Se o valor da transação for abaixo do mínimo, ajusta o trade_size
-            trade_size = min_notional / last_price
-            print(f"⚠️ Ajustando trade_size para o valor mínimo permitido: {trade_size}")
-        
-        # Garantir que o trade_size não seja muito pequeno
-        return max(trade_size, 0.1)  # Garante que a ordem tenha pelo menos 0.1 moeda
+        return float(self.exchange.amount_to_precision(self.symbol, trade_size))
 
     def update_pnl(self, pnl):
         """Atualiza o saldo e verifica os limites de perda e lucro"""
         self.daily_pnl += pnl
         self.current_balance += pnl
 
-        if self.daily_pnl <= -self.max_daily_loss:
-            self.send_telegram_message(f"🛑 Limite de perda diária atingido: ${self.daily_pnl:.2f}. Parando o bot.")
-            self.bot_running = False
-        elif self.daily_pnl >= self.daily_profit_target:
-            self.send_telegram_message(f"✅ Meta de lucro diário atingida: ${self.daily_pnl:.2f}. Parando o bot.")
+        # A posição já foi encerrada pelo TP/SL, então não há o que fechar a mercado
+        reason = self.risk.realize(self.symbol, pnl)
+        if reason:
+            self.handle_risk_limit(reason, close_position=False)
+
+    def handle_risk_limit(self, reason: str, close_position: bool = True) -> None:
+        """
+        Para o bot quando um limite do RiskEngine é atingido; nas perdas, zera a posição imediatamente.
+
+        Faz chamadas REST: roda no loop do bot (ver `run`), nunca no callback do WebSocket. Se o fechamento
+        falhar, o bot continua rodando só para tentar de novo (o limite impede novas entradas).
+        """
+        pnl = self.risk.daily_pnl()
+
+        if reason == 'profit':
             self.bot_running = False
-    ####### END - TENTATIVA GESTÃO DE RISCO CONFIG ######################################
+            self.send_telegram_message(f"✅ Meta de lucro diário atingida: ${pnl:.2f}. Parando o bot.")
+            return
+
+        if not (self.active_position and self.active_position.get('close_pending')):
+            label = "Limite de perda diária" if reason == 'loss' else "Drawdown máximo do dia"
+            self.send_telegram_message(
+                f"🛑 {label} atingido: PNL ${pnl:.2f} (drawdown ${self.risk.drawdown:.2f}). Parando o bot e fechando a posição."
+            )
+        if close_position and not self.close_position_market():
+            return
+        self.bot_running = False
+
+    def close_position_market(self) -> bool:
+        """
+        Cancela TP/SL e fecha a posição ativa a mercado (no spot, as ordens abertas travam o saldo da moeda,
+        então o cancelamento vem antes). Retorna False se a posição continuar aberta.
+
+        Antes de cancelar, verifica se o TP ou o SL já executou (ex.: no mesmo tick que disparou o limite):
+        nesse caso a posição já está zerada e não há ordem a mercado. Se a ordem a mercado falhar
+        `CLOSE_RETRIES` vezes, recoloca um SL de proteção e marca a posição com `close_pending`, para o loop
+        principal tentar de novo.
+        """
+        if self.active_position and self.settle_filled_orders():
+            return True
+
+        if not self.active_position:
+            self.cancel_all_orders()
+            return True
+
+        position = self.active_position
+        close_side = 'sell' if position['side'] == 'buy' else 'buy'
+        try:
+            self.exchange.cancel_all_orders(self.symbol)
+        except Exception as e:
+            self.log.error(f"Erro ao cancelar TP/SL antes do fechamento: {e}", self.symbol)
+
+        error = None
+        for attempt in range(CLOSE_RETRIES):
+            try:
+                order = self.exchange.create_order(
+                    symbol=self.symbol,
+                    type='market',
+                    side=close_side,
+                    amount=float(self.exchange.amount_to_precision(self.symbol, position['trade_size'])),
+                )
+                break
+            except Exception as e:
+                error = e
+                self.log.error(f"Erro ao fechar posição a mercado (tentativa {attempt + 1}): {e}", self.symbol)
+                if attempt + 1 < CLOSE_RETRIES:
+                    time.sleep(CLOSE_RETRY_DELAY)
+        else:
+            # A falha pode ser falta de saldo porque o TP/SL executou entre a verificação e o cancelamento
+            if self.settle_filled_orders():
+                return True
+            if not position.get('close_pending'):
+                self.send_telegram_message(f"🚨 Erro ao fechar posição a mercado: {error}. Recolocando o SL e tentando de novo.")
+            stop = position.get('stop')
+            if stop:
+                self.restore_stop_loss(position['trade_size'], [stop.sent_price, stop.stop_price], close_on_failure=False)
+            position['close_pending'] = True
+            return False
+
+        exit_price = float(order.get('average') or order.get('price') or self.ws.get_price())
+        pnl = (exit_price - position['entry_price']) * float(position['trade_size'])
+        if position['side'] == 'sell':
+            pnl = -pnl
+
+        self.active_position = None
+        self.daily_pnl += pnl
+        self.current_balance += pnl
+        self.risk.realize(self.symbol, pnl)
+        self.log.fill(self.symbol, close_side, exit_price, pnl=pnl, amount=float(position['trade_size']), reason='risk_limit')
+        self.send_telegram_message(f"🚪 Posição fechada a mercado em ${exit_price:.4f} (${pnl:.2f})")
+        return True
+    ####### END - GESTÃO DE RISCO ########################################################
 
     def check_order_execution(self, order_id: str) -> Optional[Dict]:
         """
@@ -447,7 +956,7 @@ class TradingBot:
                 required_usdt = trade_size * float(self.ws.get_price())
                 
                 if available_usdt < required_usdt:
-                    print(f"Saldo USDT insuficiente. Disponível: {available_usdt}, Necessário: {required_usdt}")
+                    self.log.info("Saldo USDT insuficiente", self.symbol, WARNING, available=available_usdt, required=required_usdt)
                     return False
             
             # Para venda, verifica a moeda base (ex: DOGE)
@@ -456,13 +965,13 @@ class TradingBot:
                 available_base = float(balance[base_currency]['free'])
                 
                 if available_base < trade_size:
-                    print(f"Saldo {base_currency} insuficiente. Disponível: {available_base}, Necessário: {trade_size}")
+                    self.log.info(f"Saldo {base_currency} insuficiente", self.symbol, WARNING, available=available_base, required=trade_size)
                     return False
             
             return True
                 
         except Exception as e:
-            print(f"Erro ao verificar saldo: {e}")
+            self.log.error(f"Erro ao verificar saldo: {e}", self.symbol)
             return False
     
     def check_active_orders(self) -> bool:
@@ -492,112 +1001,229 @@ class TradingBot:
         try:
             current_price = self.ws.get_price()
             if current_price is None:
-                print("⏳ Aguardando preço do WebSocket para verificar posição...")
+                self.log.info("⏳ Aguardando preço do WebSocket para verificar posição...", self.symbol, DEBUG)
                 return
             
-            entry_price = self.active_position['entry_price']
-            trade_size = self.active_position['trade_size']  
-            
-            # Verifica TP e SL diretamente
-            tp_executed = self.check_order_execution(self.active_position['tp_order_id'])
-            sl_executed = self.check_order_execution(self.active_position['sl_order_id'])
-            
-            if tp_executed: # Se TP foi executado
-                profit = ((tp_executed['price'] - entry_price) / entry_price) * 100
-                profit_absolute = (tp_executed['price'] - entry_price) * trade_size
-                
-                if self.active_position['side'] == 'sell':
-                    profit = -profit
-                    profit_absolute = -profit_absolute
-                
-                self.send_telegram_message(
-                    f"✅ TAKE PROFIT Executado!\n"
-                    f"Entrada: ${entry_price:.4f}\n"
-                    f"Saída: ${tp_executed['price']:.4f}\n"
-                    f"Lucro: {profit:.2f}% (${profit_absolute:.2f})\n"
-                    f"Quantidade: {float(trade_size)}"
-                )
-                
-                # Atualiza o PNL do dia
-                self.update_pnl(profit_absolute)
-
-                # Atualiza o Active Position para None e Encerra todas as ordens ativas (TP e SL restantes)
-                self.active_position = None
-                self.cancel_all_orders()
-                
-            elif sl_executed: # Se o SL foi atingido
-                loss = ((sl_executed['price'] - entry_price) / entry_price) * 100
-                loss_absolute = (sl_executed['price'] - entry_price) * float(trade_size)
-                
-                if self.active_position['side'] == 'sell':
-                    loss = -loss
-                    loss_absolute = -loss_absolute
-                
-                self.send_telegram_message(
-                    f"🛑 STOP LOSS Executado!\n"
-                    f"Entrada: ${entry_price:.4f}\n"
-                    f"Saída: ${sl_executed['price']:.4f}\n"
-                    f"Perda: {loss:.2f}% (${loss_absolute:.2f})\n"
-                    f"Quantidade: {float(trade_size)}"
-                )
-
-                # Atualiza o PNL do dia
-                self.update_pnl(loss_absolute)
+            if self.settle_filled_orders():
+                return
 
-                # Atualiza o Active Position para None e Encerra todas as ordens ativas (TP e SL restantes)
-                self.active_position = None
-                self.cancel_all_orders()
-            
-            # Break-even logic - só executa se ainda houver ordens ativas
-            elif (current_price >= self.active_position['entry_price'] * BREAK_EVEN_TRIGGER and
-                  self.active_position['side'] == 'buy' and
-                  self.check_active_orders()):
-                self.move_stop_loss_to_breakeven(trade_size=trade_size)
+            # Break-even / trailing - só envia se o nível do stop mudou localmente
+            if self.active_position.get('stop') and self.active_position['stop'].pending():
+                self.replace_stop_loss(trade_size=self.active_position['trade_size'])
             
         except Exception as e:
+            self.log.error(f"Erro ao verificar posição: {e}", self.symbol)
             self.send_telegram_message(f"Erro ao verificar posição: {e}")
 
-    def move_stop_loss_to_breakeven(self, trade_size: float) -> None:
-        """Move o stop loss para o preço de entrada"""
-        try:
-            # Cancela apenas as ordens de SL existentes
-            open_orders = self.exchange.fetch_open_orders(self.symbol)
-            for order in open_orders:
-                if order['type'] == 'STOP_LOSS_LIMIT':
-                    self.exchange.cancel_order(order['id'], self.symbol)
+    def settle_filled_orders(self) -> bool:
+        """
+        Verifica se o TP ou o SL da posição ativa foi executado e, nesse caso, registra o resultado e encerra
+        a posição. Retorna True se a posição foi encerrada.
+        """
+        entry_price = self.active_position['entry_price']
+        trade_size = self.active_position['trade_size']
+        
+        # Verifica TP e SL diretamente
+        tp_executed = self.check_order_execution(self.active_position['tp_order_id'])
+        sl_executed = self.check_order_execution(self.active_position['sl_order_id'])
+        
+        if tp_executed: # Se TP foi executado
+            profit = ((tp_executed['price'] - entry_price) / entry_price) * 100
+            profit_absolute = (tp_executed['price'] - entry_price) * trade_size
             
-            entry_price = self.active_position['entry_price']
+            if self.active_position['side'] == 'sell':
+                profit = -profit
+                profit_absolute = -profit_absolute
             
-            # Cria nova ordem SL no break-even
-            self.exchange.create_order(
-                self.symbol,
-                'STOP_LOSS_LIMIT',
-                'sell',
-                float(trade_size),
-                entry_price * 0.999,
-                {'stopPrice': entry_price}
+            self.send_telegram_message(
+                f"✅ TAKE PROFIT Executado!\n"
+                f"Entrada: ${entry_price:.4f}\n"
+                f"Saída: ${tp_executed['price']:.4f}\n"
+                f"Lucro: {profit:.2f}% (${profit_absolute:.2f})\n"
+                f"Quantidade: {float(trade_size)}"
             )
             
-            self.send_telegram_message("Stop Loss movido para break-even")
+            self.log.fill(self.symbol, 'tp', tp_executed['price'], pnl=profit_absolute, amount=float(trade_size))
+
+            # Atualiza o PNL do dia
+            self.update_pnl(profit_absolute)
+
+            # Atualiza o Active Position para None e Encerra todas as ordens ativas (TP e SL restantes)
+            self.active_position = None
+            self.cancel_all_orders()
+            return True
+
+        elif sl_executed: # Se o SL foi atingido
+            loss = ((sl_executed['price'] - entry_price) / entry_price) * 100
+            loss_absolute = (sl_executed['price'] - entry_price) * float(trade_size)
+            
+            if self.active_position['side'] == 'sell':
+                loss = -loss
+                loss_absolute = -loss_absolute
             
+            self.send_telegram_message(
+                f"🛑 STOP LOSS Executado!\n"
+                f"Entrada: ${entry_price:.4f}\n"
+                f"Saída: ${sl_executed['price']:.4f}\n"
+                f"Perda: {loss:.2f}% (${loss_absolute:.2f})\n"
+                f"Quantidade: {float(trade_size)}"
+            )
+
+            self.log.fill(self.symbol, 'sl', sl_executed['price'], pnl=loss_absolute, amount=float(trade_size))
+
+            # Atualiza o PNL do dia
+            self.update_pnl(loss_absolute)
+
+            # Atualiza o Active Position para None e Encerra todas as ordens ativas (TP e SL restantes)
+            self.active_position = None
+            self.cancel_all_orders()
+            return True
+
+        return False
+
+    def on_paper_price(self, price: float) -> None:
+        """No modo simulação, repassa o preço à PaperExchange para executar as ordens de TP/SL"""
+        if self.paper_exchange is not None:
+            self.paper_exchange.on_price(self.symbol, price)
+
+    def on_candle(self, candle: list, closed: bool) -> None:
+        """
+        Vela do stream de kline: no modo simulação, alimenta a PaperExchange (fetch_ohlcv sem REST); no modo
+        sombra, atualiza a janela de velas e avalia as entradas das variantes com os mesmos indicadores que o
+        `get_indicators` calcularia agora (vela em formação incluída), sem REST e sem afetar as ordens do bot.
+        """
+        if self.paper_exchange is not None:
+            self.paper_exchange.on_candle(self.symbol, CANDLE_TIMEFRAME, candle)
+
+        window = self.shadow_candles
+        if self.shadow and window and candle[0] >= window[-1][0]:
+            if candle[0] == window[-1][0]:
+                window[-1] = list(candle)
+            else:
+                window.append(list(candle))
+            self.shadow.on_indicators(candle[4], IndicatorState.from_candles(window).values())
+
+    def seed_shadow(self) -> None:
+        """Carrega a janela inicial do modo sombra (uma chamada REST, fora do WebSocket)"""
+        self.shadow_candles = deque(
+            self.exchange.fetch_ohlcv(self.symbol, CANDLE_TIMEFRAME, limit=self.shadow_candles.maxlen),
+            maxlen=self.shadow_candles.maxlen,
+        )
+
+    def on_price(self, price: float) -> None:
+        """
+        Chamado pelo WebSocket a cada novo preço. Apenas atualiza o estado local (sem REST): quando um limite
+        de risco é atingido, o RiskEngine marca `halted` e o loop principal é acordado para fechar a posição.
+        """
+        position = self.active_position
+        if position and position.get('stop'):
+            position['stop'].on_price(price)
+
+        # Saídas (TP/SL) das posições hipotéticas do modo sombra; as entradas são avaliadas em on_candle
+        if self.shadow:
+            self.shadow.on_tick(price)
+
+        # O motivo pode vir de outro bot que compartilha o mesmo RiskEngine
+        reason = self.risk.on_price(self.symbol, price) or self.risk.halted
+        if reason and self.bot_running:
+            self.wake()
+
+    def wake(self) -> None:
+        """Acorda o loop principal (pode ser chamado de qualquer thread)"""
+        if self.loop is not None and self.wakeup is not None and not self.wakeup.is_set():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def replace_stop_loss(self, trade_size: float) -> None:
+        """
+        Move a ordem de SL para o nível calculado pelo StopManager.
+
+        Usa o endpoint `order.cancelReplace` da Binance, que cancela a ordem antiga e cria a nova em uma única
+        chamada. Não é atômico: com STOP_ON_FAILURE o cancelamento pode dar certo e a nova ordem falhar (HTTP 409,
+        `cancelResult=SUCCESS`, `newOrderResult=FAILURE`); nesse caso a posição está sem stop e um novo SL é
+        criado na hora (ver `restore_stop_loss`).
+        """
+        stop = self.active_position['stop']
+        new_stop = stop.stop_price
+        sl_side = 'sell' if self.active_position['side'] == 'buy' else 'buy'
+
+        try:
+            stop_price = self.exchange.price_to_precision(self.symbol, new_stop)
+            limit_price = self.exchange.price_to_precision(
+                self.symbol, new_stop * (0.999 if sl_side == 'sell' else 1.001)
+            )
+
+            response = self.exchange.private_post_order_cancelreplace({
+                'symbol': self.exchange.market_id(self.symbol),
+                'side': sl_side.upper(),
+                'type': 'STOP_LOSS_LIMIT',
+                'cancelReplaceMode': 'STOP_ON_FAILURE',
+                'cancelOrderId': self.active_position['sl_order_id'],
+                'quantity': self.exchange.amount_to_precision(self.symbol, trade_size),
+                'price': limit_price,
+                'stopPrice': stop_price,
+                'timeInForce': 'GTC',
+            })
+
+            self.active_position['sl_order_id'] = str(response['newOrderResponse']['orderId'])
+            stop.sent_price = new_stop
+
+            label = "break-even" if new_stop == stop.entry_price else f"${float(stop_price):.4f}"
+            self.send_telegram_message(f"Stop Loss movido para {label}")
+
         except Exception as e:
-            self.send_telegram_message(f"Erro ao mover SL para break-even: {e}")
+            result = cancel_replace_result(e)
+            if result and result.get('cancelResult') == 'SUCCESS':
+                # O SL antigo foi cancelado e o novo não entrou: a posição está sem stop
+                self.log.error(f"cancelReplace parcial: SL cancelado sem substituto ({e})", self.symbol)
+                self.restore_stop_loss(trade_size, [new_stop, stop.sent_price])
+                return
+
+            # Nada mudou na exchange: mantém o nível pendente, será reenviado na próxima verificação
+            self.send_telegram_message(f"Erro ao mover SL: {e}")
+
+    def restore_stop_loss(self, trade_size: float, levels: list, close_on_failure: bool = True) -> bool:
+        """
+        Cria um novo SL para a posição ativa, tentando os níveis na ordem (ex.: o novo e depois o último enviado).
+        Se nenhum for aceito (ex.: o preço já passou do stop), fecha a posição a mercado (`close_on_failure`).
+        """
+        stop = self.active_position['stop']
+        sl_side = 'sell' if self.active_position['side'] == 'buy' else 'buy'
+        amount = float(self.exchange.amount_to_precision(self.symbol, trade_size))
+
+        for level in levels:
+            try:
+                stop_price = float(self.exchange.price_to_precision(self.symbol, level))
+                order = self.exchange.create_order(
+                    symbol=self.symbol,
+                    type='STOP_LOSS_LIMIT',
+                    side=sl_side,
+                    amount=amount,
+                    price=stop_price * (0.999 if sl_side == 'sell' else 1.001),
+                    params={'stopPrice': stop_price},
+                )
+                self.active_position['sl_order_id'] = order['id']
+                stop.sent_price = level
+                if self.active_position.get('close_pending'):
+                    self.log.info(f"SL recolocado em ${stop_price:.4f}", self.symbol, WARNING)
+                else:
+                    self.send_telegram_message(f"⚠️ SL recriado em ${stop_price:.4f}")
+                return True
+            except Exception as e:
+                self.log.error(f"Erro ao recriar SL em {level}: {e}", self.symbol)
+
+        if close_on_failure:
+            self.send_telegram_message("🚨 Não foi possível recriar o SL. Fechando a posição a mercado.")
+            self.close_position_market()
+        else:
+            self.send_telegram_message("🚨 Não foi possível recriar o SL: posição sem stop na exchange.")
+        return False
 
     ####### INDICADORES DE MERCADO ########################################################
     def get_rsi(self, timeframe='5m', period=14):
         """Calcula o RSI para o símbolo atual"""
         try:
             candles = self.exchange.fetch_ohlcv(self.symbol, timeframe, limit=period+1)
-            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            
-            delta = df['close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-            
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            
-            return rsi.iloc[-1]
+            return IndicatorState.from_candles(candles, period).values()['RSI']
         except Exception as e:
             self.send_telegram_message(f"Erro ao calcular RSI: {e}")
             return None
@@ -606,43 +1232,17 @@ class TradingBot:
         """Calcula o volume médio para o símbolo atual"""
         try:
             candles = self.exchange.fetch_ohlcv(self.symbol, timeframe, limit=period)
-            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            return df['volume'].mean()
+            return sum(candle[5] for candle in candles) / len(candles)
         except Exception as e:
             self.send_telegram_message(f"Erro ao calcular volume: {e}")
             return None
     
-    def get_indicators(self, timeframe='5m', period=14):
+    def get_indicators(self, timeframe=CANDLE_TIMEFRAME, period=14):
         # Obtém as velas (OHLCV)
         candles = self.exchange.fetch_ohlcv(self.symbol, timeframe, limit=period+1)
-        df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        
-        df['EMA9'] = df['close'].ewm(span=9, adjust=False).mean()
-
-        # Cálculo do RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        df['RSI'] = 100 - (100 / (1 + gain / loss))
-
-        # Cálculo do ATR (Average True Range)
-        df['ATR'] = df['high'] - df['low']  # ATR simples, você pode usar uma média ou fórmula ajustada aqui
-        df['ATR'] = df['ATR'].rolling(window=period).mean()  # Média para suavizar
-        
-        # Cálculo do MACD
-        df['EMA_fast'] = df['close'].ewm(span=12, adjust=False).mean()  # EMA de curto prazo
-        df['EMA_slow'] = df['close'].ewm(span=26, adjust=False).mean()  # EMA de longo prazo
-        df['MACD'] = df['EMA_fast'] - df['EMA_slow']  # Diferença entre as EMAs
-        df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()  # Linha de sinal do MACD
 
-        # Retorna os últimos valores
-        return {
-            'RSI': df['RSI'].iloc[-1],
-            'ATR': df['ATR'].iloc[-1],
-            'MACD': df['MACD'].iloc[-1],
-            'Signal_Line': df['Signal_Line'].iloc[-1],
-            'volume': df['volume'].iloc[-1]  # Garantindo que o volume seja retornado
-        }
+        # RSI, ATR (média de high - low), MACD e linha de sinal, sem pandas no caminho do loop principal
+        return IndicatorState.from_candles(candles, period).values()
     ####### FIM INDICADORES DE MERCADO ####################################################
     def cancel_all_orders(self) -> None:
         """
@@ -656,23 +1256,20 @@ class TradingBot:
             
             # Reseta o estado do bot
             self.active_position = None
+            self.risk.remove_position(self.symbol)
             
             self.send_telegram_message(f"🚫 Todas as ordens restantes foram canceladas para {self.symbol}")
-            print(f"Todas as ordens canceladas para {self.symbol}")
+            self.log.order(self.symbol, 'cancel_all', f"Todas as ordens canceladas para {self.symbol}")
             
         except Exception as e:
             error_msg = f"Erro ao cancelar ordens: {e}"
             self.send_telegram_message(error_msg)
-            print(error_msg)
+            self.log.error(error_msg, self.symbol)
 
     def place_trade(self, side: str, price: float, trade_size: float, atr: float) -> None:
         """Executa uma nova operação com gestão de ordens"""
         try:
-            if self.simulation_mode:
-                self.send_telegram_message(f"[SIMULAÇÃO] {side.upper()} {trade_size} {self.symbol} a {price}")
-                return
-            
-            print(f"\n🏁 Iniciando operação {side} de {float(trade_size)} {self.symbol} a {price}")
+            self.log.order(self.symbol, side, f"🏁 Iniciando operação {side} de {float(trade_size)} {self.symbol} a {price}", type='market', amount=float(trade_size), price=price)
 
             if self.active_position or self.check_active_orders():
                 self.send_telegram_message("❌ Já existe uma posição ativa ou ordens abertas. Ignorando novo sinal.")
@@ -697,7 +1294,7 @@ class TradingBot:
             
             # Pega o preço real de execução
             executed_price = float(order.get('average', order.get('price', float(price))))
-            print(f"Ordem executada a {executed_price}")
+            self.log.fill(self.symbol, side, executed_price, f"Ordem executada a {executed_price}", order_id=order.get('id'), amount=float(trade_size))
 
             if order and 'id' in order:
                 self.active_position = {
@@ -706,6 +1303,7 @@ class TradingBot:
                     'order_id': order['id'],
                     'trade_size': trade_size
                 }
+                self.risk.open_position(self.symbol, side, executed_price, float(trade_size))
                 
                 # Calcula preços TP/SL
                 if side == 'buy':
@@ -724,8 +1322,8 @@ class TradingBot:
                 sl_price = self.exchange.price_to_precision(self.symbol, sl_price)
                 trade_size_amount = self.exchange.amount_to_precision(self.symbol, trade_size)
                 
-                print(f"📈 Criando TP: {tp_side} {trade_size_amount} {self.symbol} @ {tp_price}")
-                print(f"📉 Criando SL: {sl_side} {trade_size_amount} {self.symbol} @ {sl_price}")
+                self.log.order(self.symbol, tp_side, f"📈 Criando TP: {tp_side} {trade_size_amount} {self.symbol} @ {tp_price}", type='TAKE_PROFIT_LIMIT', amount=trade_size_amount, price=tp_price)
+                self.log.order(self.symbol, sl_side, f"📉 Criando SL: {sl_side} {trade_size_amount} {self.symbol} @ {sl_price}", type='STOP_LOSS_LIMIT', amount=trade_size_amount, price=sl_price)
 
                 # Coloca as ordens de TP
                 tp_order = self.exchange.create_order(
@@ -751,6 +1349,7 @@ class TradingBot:
                 self.active_position.update({
                     'tp_order_id': tp_order['id'],
                     'sl_order_id': sl_order['id'],
+                    'stop': StopManager(side, executed_price, float(sl_price), atr),
                 })
 
                 # Calcula percentual de lucro e risco
@@ -778,13 +1377,13 @@ class TradingBot:
                 self.send_telegram_message(
                     f"📌 Nova posição: {side.upper()} {self.symbol}\n"
                     f"💰 Preço: ${executed_price:.4f}\n"
-                    f"📈 TP: ${tp_price:.4f} (+{profit_target:.2f}%)\n"
-                    f"📉 SL: ${sl_price:.4f} (-{loss_risk:.2f}%)\n"
+                    f"📈 TP: ${float(tp_price):.4f} (+{profit_target:.2f}%)\n"
+                    f"📉 SL: ${float(sl_price):.4f} (-{loss_risk:.2f}%)\n"
                     f"📦 Quantidade: {trade_size_amount}"
                 )
                 
         except Exception as e:
-            print(f"❌ Erro detalhado ao executar ordem: {str(e)}")
+            self.log.error(f"❌ Erro detalhado ao executar ordem: {str(e)}", self.symbol, side=side)
             self.send_telegram_message(f"❌ Erro ao executar ordem: {str(e)}")
             self.active_position = None
 
@@ -792,26 +1391,11 @@ class TradingBot:
         """Executa a lógica principal de trading"""
         try:
             if not self.bot_running:
-                print("🤖🙉 Bot está parado. Ignorando novos sinais.")
-                return
-            
-            # Verifica se atingiu a meta diária ou limite de perda
-            if self.daily_pnl <= -self.max_daily_loss:
-                self.send_telegram_message(f"🛑 Limite de perda diária atingido: ${self.daily_pnl:.2f}. Parando o bot e Fechando todas as posições.")
-                self.cancel_all_orders()
-                self.active_position = None
-                self.bot_running = False
+                self.log.info("🤖🙉 Bot está parado. Ignorando novos sinais.", self.symbol, DEBUG)
                 return
             
-            if self.daily_pnl >= self.daily_profit_target:
-                self.send_telegram_message(f"✅ Meta de lucro diário atingida: ${self.daily_pnl:.2f}. Parando o bot.")
-                self.bot_running = False
-                return
-
-            # Ajusta tamanho da ordem baseado no saldo
-            trade_size = QUANTIDADE_OPERACAO # self.calculate_trade_size() # TODO: Corrigir depois esse trade size.
-            if trade_size < 0.1:
-                self.send_telegram_message("🚨 Valor de ordem abaixo do mínimo permitido. Aguardando saldo aumentar.")
+            # Limite atingido (PNL realizado + não realizado): o `run()` fecha a posição, aqui só não opera
+            if self.risk.halted:
                 return
 
             # Verifica posição atual primeiro, para saber se podemos abrir uma nova posição.
@@ -819,7 +1403,7 @@ class TradingBot:
 
             if self.active_position:
                 # Caso não tenha entrado nas condições da função acima, a posição ainda está ativa.
-                print("🛑 Posição já ativa. Aguardando fechamento antes de abrir nova operação.")
+                self.log.info("🛑 Posição já ativa. Aguardando fechamento antes de abrir nova operação.", self.symbol, DEBUG)
                 return
             
             # Obtem indicadores do mercado: RSI, Volume e Tendência
@@ -827,41 +1411,81 @@ class TradingBot:
 
             # Se houver erro nos dados, ignora a iteração
             if indicators['RSI'] is None or indicators['volume'] is None:
-                print("⚠️ Dados de mercado inválidos. Ignorando esta iteração.")
+                self.log.info("⚠️ Dados de mercado inválidos. Ignorando esta iteração.", self.symbol, WARNING)
                 return
 
-            print(f"🔎 RSI: {indicators['RSI']:.2f}, Volume: {indicators['volume']:.2f}, MACD: {indicators['MACD']:.4f}, Signal Line: {indicators['Signal_Line']:.4f}, ATR: {indicators['ATR']} - {self.symbol} a {price}")
+            # Os valores vão crus para a fila; a linha do terminal é montada na thread do log
+            self.log.tick(
+                self.symbol, price, rsi=indicators['RSI'], volume=indicators['volume'], macd=indicators['MACD'],
+                signal_line=indicators['Signal_Line'], atr=indicators['ATR'],
+            )
 
+            side = None
             if indicators['RSI'] < 30 and indicators['volume'] > MIN_VOLUME_THRESHOLD: # Usar ATR > 0 ?
             # if indicators['RSI'] < 30 and indicators['MACD'] > indicators['Signal_Line']: # Usar ATR > 0 ?
-                self.place_trade('buy', price, trade_size, indicators['ATR'])
+                side = 'buy'
             elif indicators['RSI'] > 70 and indicators['volume'] > MIN_VOLUME_THRESHOLD: # Usar ATR > 0 ?
             # elif indicators['RSI'] > 70 and indicators['MACD'] < indicators['Signal_Line']: # Usar ATR > 0 ?
-                self.place_trade('sell', price, trade_size, indicators['ATR'])
+                side = 'sell'
+
+            if side:
+                self.log.signal(self.symbol, side, price=price, rsi=indicators['RSI'], volume=indicators['volume'], atr=indicators['ATR'])
+
+                # Ajusta tamanho da ordem pelo ATR e pelo saldo em cache
+                trade_size = self.calculate_trade_size(price, indicators['ATR'])
+                if not trade_size:
+                    self.log.info("Ordem abaixo do mínimo permitido", self.symbol, WARNING, price=price, atr=indicators['ATR'])
+                    self.send_telegram_message("🚨 Valor de ordem abaixo do mínimo permitido. Aguardando saldo aumentar.")
+                    return
+
+                self.place_trade(side, price, trade_size, indicators['ATR'])
 
         except Exception as e:
+            self.log.error(f"Erro na execução principal: {e}", self.symbol)
             self.send_telegram_message(f"Erro na execução principal: {e}")
     
     async def run(self):
         """Executa o loop principal do bot"""
-        print("🔄 Iniciando loop principal...")
+        self.log.info("🔄 Iniciando loop principal...", self.symbol)
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
         while self.bot_running:
             try:
+                # Limite de risco marcado pelo on_price: fecha a posição numa thread (REST), sem travar o
+                # WebSocket e sem disputar a posição com o trade(), que só roda depois
+                if self.risk.halted:
+                    await asyncio.to_thread(self.handle_risk_limit, self.risk.halted)
+                    if self.bot_running:
+                        await asyncio.sleep(CLOSE_RETRY_DELAY)  # Fechamento pendente: tenta de novo
+                    continue
+
                 price = self.ws.get_price()
 
+                # trade() faz REST (e espera em place_trade): roda numa thread para não travar o loop, onde
+                # ficam os WebSockets e, no modo cluster, o heartbeat do worker
                 if price:
-                    self.trade(price)
+                    await asyncio.to_thread(self.trade, price)
 
-                await asyncio.sleep(1)  # Delay entre iterações
+                # Delay entre iterações (ou até o on_price avisar de um limite de risco)
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
             except Exception as e:
-                print(f"❌ Erro no loop principal: {e}")
+                self.log.error(f"❌ Erro no loop principal: {e}", self.symbol)
                 await asyncio.sleep(5)  # Delay maior em caso de erro
 
 class BinanceWebSocket:
-    def __init__(self, symbol: str):
+    COMBINED_STREAMS_PER_CONNECTION = 200  # A Binance aceita até 1024 streams por conexão
+
+    def __init__(self, symbol: str, recorder=None):
         self.symbol = symbol.lower().replace("/", "")
         self.price = None
         self.ws_url = f"wss://stream.binance.com:9443/ws/{self.symbol}@ticker"
+        self.listeners = []  # Callbacks chamados a cada novo preço
+        self.candle_listeners = []  # Callbacks chamados a cada atualização de vela (ver connect_klines)
+        self.recorder = recorder  # MarketRecorder opcional (ver recorder.py) para gravar o que o bot viu
 
     async def connect(self):
         """Conecta ao WebSocket da Binance"""
@@ -869,17 +1493,86 @@ class BinanceWebSocket:
             try:
                 async with websockets.connect(self.ws_url) as websocket:
                     async for message in websocket:
-                        data = json.loads(message)
-                        self.price = float(data["c"])
+                        self.on_message(message)
 
             except Exception as e:
                 print(f"⚠️ Erro WebSocket: {e}")
                 await asyncio.sleep(5)
+
+    async def connect_klines(self, timeframe: str = CANDLE_TIMEFRAME):
+        """Conecta ao stream de kline do par (conexão separada do ticker)"""
+        while True:
+            try:
+                url = f"wss://stream.binance.com:9443/ws/{self.symbol}@kline_{timeframe}"
+                async with websockets.connect(url) as websocket:
+                    async for message in websocket:
+                        self.on_kline(message, timeframe)
+
+            except Exception as e:
+                print(f"⚠️ Erro WebSocket (kline): {e}")
+                await asyncio.sleep(5)
+
+    def on_kline(self, message: str, timeframe: str = CANDLE_TIMEFRAME):
+        """Processa uma mensagem de kline: repassa a vela [ts, o, h, l, c, v] e se ela já fechou"""
+        if self.recorder:
+            self.recorder.write(f"{self.symbol}@kline_{timeframe}", message)
+
+        k = json.loads(message)['k']
+        if k['s'].lower() != self.symbol:
+            return  # Conexão antiga de antes de uma troca de par
+
+        candle = [k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])]
+        for listener in self.candle_listeners:
+            listener(candle, k['x'])
+
+    def on_message(self, message: str):
+        """Processa uma mensagem do stream de ticker"""
+        if self.recorder:
+            self.recorder.write(f"{self.symbol}@ticker", message)
+
+        data = json.loads(message)
+        self.price = float(data["c"])
+
+        for listener in self.listeners:
+            listener(self.price)
                 
+    async def record(self, streams: list):
+        """
+        Modo gravador: assina os streams combinados (ex.: xrpusdt@trade) e grava cada mensagem bruta
+        no `self.recorder`, sem decodificar o JSON.
+        """
+        batch = self.COMBINED_STREAMS_PER_CONNECTION
+        await asyncio.gather(*(
+            self._record_connection(streams[i:i + batch]) for i in range(0, len(streams), batch)
+        ))
+
+    async def _record_connection(self, streams: list):
+        url = "wss://stream.binance.com:9443/stream?streams=" + "/".join(streams)
+        while True:
+            try:
+                async with websockets.connect(url, max_queue=None) as websocket:
+                    async for message in websocket:
+                        recv_ts = time.time_ns() // 1000
+                        # Formato: {"stream":"<nome>","data":{...}} -> extrai o nome e os dados sem json.loads
+                        end = message.index('"', 11)
+                        self.recorder.write(message[11:end], message[end + 9:-1], recv_ts)
+
+            except Exception as e:
+                print(f"⚠️ Erro WebSocket (gravação): {e}")
+                await asyncio.sleep(5)
+
     def get_price(self):
         """Retorna o preço atualizado pela WebSocket"""
         return self.price
 
+    def add_listener(self, callback):
+        """Registra um callback `callback(price)` chamado a cada mensagem de preço"""
+        self.listeners.append(callback)
+
+    def add_candle_listener(self, callback):
+        """Registra um callback `callback(candle, closed)` chamado a cada mensagem de kline"""
+        self.candle_listeners.append(callback)
+
     def change_symbol(self, new_symbol: str):
         """Troca o símbolo do WebSocket"""
         self.symbol = new_symbol
@@ -887,16 +1580,48 @@ class BinanceWebSocket:
         self.price = None  # Reseta o preço
 
 
+async def wait_first_price(ws: BinanceWebSocket, timeout: float = 10.0) -> float:
+    """Aguarda o primeiro preço do WebSocket e retorna o instante (perf_counter) em que chegou"""
+    deadline = time.perf_counter() + timeout
+    while ws.get_price() is None and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    return time.perf_counter()
+
+
+async def run_scanner(scanner) -> None:
+    """
+    Carrega o histórico do scanner em uma thread e depois acompanha os streams.
+
+    Usa um cliente público próprio: as centenas de fetch_ohlcv não gastam o limite de peso do cliente
+    de trading nem compartilham a instância do ccxt entre threads.
+    """
+    import ccxt
+
+    public = ccxt.binance({'enableRateLimit': True})
+    await asyncio.to_thread(scanner.load_history, public)
+    await scanner.run()
+
+
 async def main():
+    started = time.perf_counter()
     print("🚀 Iniciando sistema...")
 
-    # Inicializa WebSocket
-    ws = BinanceWebSocket(PAR_SYMBOL)
+    recorder = None
+    if MARKET_RECORDER_DIR:
+        from recorder import MarketRecorder
+
+        recorder = MarketRecorder(MARKET_RECORDER_DIR).start()
+        print(f"🎙️ Gravando dados de mercado em {MARKET_RECORDER_DIR}")
+
+    # Inicializa WebSocket: conecta já, enquanto exchange e Telegram são configurados
+    ws = BinanceWebSocket(PAR_SYMBOL, recorder=recorder)
+    ws_task = asyncio.create_task(ws.connect())
+    first_price = asyncio.create_task(wait_first_price(ws))
     print("📡 WebSocket inicializado")
-    # threading.Thread(target=lambda: asyncio.run(ws.connect()), daemon=True).start()
 
-    # Inicializa Bot
-    bot = TradingBot(
+    # Inicializa Bot (em uma thread, para não travar o WebSocket)
+    bot = await asyncio.to_thread(
+        TradingBot,
         symbol=PAR_SYMBOL,
         websocket_client=ws,
         initial_balance=40,
@@ -907,21 +1632,42 @@ async def main():
     )
     print("🤖 Bot inicializado")
 
+    if SHADOW_ENABLED:
+        from shadow import DEFAULT_VARIANTS, ShadowBook
+
+        bot.shadow = ShadowBook(DEFAULT_VARIANTS, bot.initial_balance, bot.risk_per_trade)
+        await asyncio.to_thread(bot.seed_shadow)
+        print(f"👥 Modo sombra: {', '.join(bot.shadow.names)}")
+
+    # Velas pelo WebSocket: alimentam a PaperExchange no modo simulação e o modo sombra
+    tasks = [ws_task, ws.connect_klines(CANDLE_TIMEFRAME), bot.run()]
+    if SCANNER_ENABLED:
+        from scanner import MarketScanner, usdt_symbols
+
+        bot.scanner = MarketScanner(usdt_symbols(bot.exchange))
+        tasks.append(run_scanner(bot.scanner))
+        print(f"🔭 Scanner inicializado ({len(bot.scanner.symbols)} pares)")
+
+    first_price_at = await first_price
+    timings = dict(bot.startup_timings)
+    timings['primeiro preço'] = first_price_at - started
+    timings['total'] = time.perf_counter() - started
+    print("⏱️ Inicialização: " + " | ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+
     # Ativa o bot
     bot.bot_running = True
     print("✅ Bot ativado")
 
     try:
-        await asyncio.gather(
-            ws.connect(),
-            bot.run()
-        )
+        await asyncio.gather(*tasks)
     except KeyboardInterrupt:
         print("\n🛑 Encerrando o bot...")
     except Exception as e:
         print(f"❌ Erro: {e}")
     finally:
         bot.bot_running = False
+        if recorder:
+            recorder.stop()
 
 if __name__ == "__main__":
     try:
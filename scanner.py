@@ -0,0 +1,273 @@
+"""
+Scanner de mercado: acompanha todos os pares USDT e classifica os candidatos para o bot.
+
+- Um stream `!miniTicker@arr` (último preço e volume 24h de todos os pares) e streams de kline agrupados
+  em conexões combinadas de até 200 streams.
+- As velas ficam em matrizes numpy símbolos × barras (máxima, mínima, fechamento, volume); cada mensagem
+  só escreve uma célula, sem recalcular nada.
+- A cada fechamento de barra, RSI / ATR / volume de todos os pares são calculados em uma única passada
+  vetorizada (mesmas fórmulas do `IndicatorState`), e os pares que passam nos filtros são ordenados.
+
+Uso:
+    python scanner.py --timeframe 5m --top 10 --alertas
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import websockets
+
+HIGH, LOW, CLOSE, VOLUME = range(4)
+
+TIMEFRAME_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000, '1h': 3_600_000}
+RSI_OVERSOLD = 30       # Mesmos níveis de TradingBot.trade
+RSI_OVERBOUGHT = 70
+MIN_BAR_QUOTE_VOLUME = 50_000       # Volume mínimo da última barra em USDT (comparável entre pares)
+MIN_24H_QUOTE_VOLUME = 5_000_000    # Liquidez mínima em 24h (USDT)
+SCAN_DELAY = 1.0    # Espera (s) após a abertura da barra para receber as últimas atualizações da anterior
+
+
+class MarketScanner:
+    def __init__(self, symbols: List[str], timeframe: str = '5m', bars: int = 100, period: int = 14,
+                 min_bar_quote_volume: float = MIN_BAR_QUOTE_VOLUME, min_24h_quote_volume: float = MIN_24H_QUOTE_VOLUME):
+        self.symbols = list(symbols)
+        self.index: Dict[str, int] = {symbol.replace('/', '').upper(): i for i, symbol in enumerate(self.symbols)}
+        self.timeframe = timeframe
+        self.timeframe_ms = TIMEFRAME_MS[timeframe]
+        self.period = period
+        self.min_bar_quote_volume = min_bar_quote_volume
+        self.min_24h_quote_volume = min_24h_quote_volume
+
+        # Última coluna = barra em formação; NaN até haver dados (pares sem histórico ficam fora do ranking)
+        self.bars = np.full((4, len(self.symbols), bars), np.nan)
+        self.bar_ts = 0     # Abertura (ms) da barra em formação
+        self.last_price = np.full(len(self.symbols), np.nan)
+        self.quote_volume_24h = np.zeros(len(self.symbols))
+
+        self.ranking: List[dict] = []
+        self.scanned_at: Optional[float] = None
+        self.scan_ms = 0.0
+        self.listeners: List[Callable[[List[dict]], None]] = []
+        self._scan_pending = False
+
+    ####### DADOS #########################################################################
+    def load_history(self, exchange, limit: Optional[int] = None) -> None:
+        """Preenche as matrizes com velas via REST (API pública) para não esperar `period` barras"""
+        limit = limit or self.bars.shape[2]
+        try:
+            # Volume de 24h inicial (depois vem do miniTicker)
+            for symbol, ticker in exchange.fetch_tickers(self.symbols).items():
+                if symbol in self.symbols and ticker.get('quoteVolume'):
+                    self.quote_volume_24h[self.index[symbol.replace('/', '')]] = ticker['quoteVolume']
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar volumes de 24h: {e}")
+
+        for n, symbol in enumerate(self.symbols, 1):
+            try:
+                for candle in exchange.fetch_ohlcv(symbol, self.timeframe, limit=limit):
+                    self.write_candle(self.index[symbol.replace('/', '')], candle[0], candle[2], candle[3], candle[4], candle[5])
+            except Exception as e:
+                print(f"⚠️ Erro ao carregar histórico de {symbol}: {e}")
+            if n % 50 == 0:
+                print(f"📚 Histórico carregado: {n}/{len(self.symbols)}")
+
+    def write_candle(self, i: int, open_time: int, high: float, low: float, close: float, volume: float) -> None:
+        """Atualiza a vela do par `i`; uma vela de uma nova barra avança a matriz de todos os pares"""
+        if open_time > self.bar_ts:
+            self._roll(open_time)
+            column = -1
+        elif open_time == self.bar_ts:
+            column = -1
+        else:
+            column = -1 - (self.bar_ts - open_time) // self.timeframe_ms
+            if column < -self.bars.shape[2]:
+                return
+
+        self.bars[:, i, column] = (high, low, close, volume)
+
+    def on_message(self, message: str) -> None:
+        """Trata uma mensagem do stream combinado (kline de um par ou miniTicker de todos)"""
+        data = json.loads(message)['data']
+
+        if isinstance(data, list):
+            for ticker in data:
+                i = self.index.get(ticker['s'])
+                if i is not None:
+                    self.last_price[i] = float(ticker['c'])
+                    self.quote_volume_24h[i] = float(ticker['q'])
+            return
+
+        i = self.index.get(data['s'])
+        if i is not None:
+            k = data['k']
+            self.write_candle(i, k['t'], float(k['h']), float(k['l']), float(k['c']), float(k['v']))
+
+    def _roll(self, open_time: int) -> None:
+        """Abre uma nova barra para todos os pares, repetindo o último fechamento (volume 0) até chegar a vela"""
+        started = self.bar_ts > 0
+        shift = min((open_time - self.bar_ts) // self.timeframe_ms, self.bars.shape[2]) if started else 0
+        self.bar_ts = open_time
+        if not shift:
+            return
+
+        self.bars[:, :, :-shift] = self.bars[:, :, shift:]
+        previous_close = self.bars[CLOSE, :, -shift - 1] if shift < self.bars.shape[2] else np.nan
+        for column in range(-shift, 0):
+            self.bars[HIGH:CLOSE + 1, :, column] = previous_close
+            self.bars[VOLUME, :, column] = np.where(np.isnan(previous_close), np.nan, 0.0)
+        self._scan_pending = True
+
+    ####### RANKING #######################################################################
+    def compute(self) -> Dict[str, np.ndarray]:
+        """RSI, ATR e volume da última barra fechada de todos os pares, em uma passada vetorizada"""
+        closed = self.bars[:, :, :-1]
+        closes = closed[CLOSE, :, -(self.period + 1):]
+
+        deltas = np.diff(closes, axis=1)
+        gains = np.clip(deltas, 0, None).sum(axis=1)
+        losses = np.clip(-deltas, 0, None).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(losses > 0, 100 - 100 / (1 + gains / losses), np.where(gains > 0, 100.0, np.nan))
+
+        atr = (closed[HIGH, :, -self.period:] - closed[LOW, :, -self.period:]).mean(axis=1)
+        price = closes[:, -1]
+        return {
+            'rsi': rsi,
+            'atr': atr,
+            'atr_pct': atr / price,
+            'price': price,
+            'bar_quote_volume': closed[VOLUME, :, -1] * price,
+        }
+
+    def scan(self) -> List[dict]:
+        """Aplica os filtros da estratégia a todos os pares e ordena os candidatos (RSI mais extremo primeiro)"""
+        started = time.perf_counter()
+        values = self.compute()
+        rsi = values['rsi']
+
+        liquid = (values['bar_quote_volume'] > self.min_bar_quote_volume) & (self.quote_volume_24h >= self.min_24h_quote_volume)
+        with np.errstate(invalid='ignore'):
+            buy = liquid & (rsi < RSI_OVERSOLD)
+            sell = liquid & (rsi > RSI_OVERBOUGHT)
+
+        candidates = np.flatnonzero(buy | sell)
+        score = np.abs(rsi[candidates] - 50)
+        order = candidates[np.lexsort((-self.quote_volume_24h[candidates], -score))]
+
+        self.ranking = [{
+            'symbol': self.symbols[i],
+            'side': 'buy' if buy[i] else 'sell',
+            'rsi': float(rsi[i]),
+            'atr': float(values['atr'][i]),
+            'atr_pct': float(values['atr_pct'][i]),
+            'price': float(values['price'][i]),
+            'bar_quote_volume': float(values['bar_quote_volume'][i]),
+            'quote_volume_24h': float(self.quote_volume_24h[i]),
+        } for i in order]
+        self.scanned_at = time.time()
+        self.scan_ms = (time.perf_counter() - started) * 1000
+
+        for listener in self.listeners:
+            try:
+                listener(self.ranking)
+            except Exception as e:
+                print(f"⚠️ Erro no listener do scanner: {e}")
+        return self.ranking
+
+    def top(self, n: int = 10) -> List[dict]:
+        return self.ranking[:n]
+
+    def add_listener(self, callback: Callable[[List[dict]], None]) -> None:
+        """Chamado com o ranking a cada fechamento de barra"""
+        self.listeners.append(callback)
+
+    ####### WEBSOCKET #####################################################################
+    def streams(self) -> List[List[str]]:
+        """Streams agrupados por conexão (limite de streams combinados da Binance)"""
+        from scalpingv2 import BinanceWebSocket
+
+        streams = ['!miniTicker@arr'] + [f"{symbol_id.lower()}@kline_{self.timeframe}" for symbol_id in self.index]
+        batch = BinanceWebSocket.COMBINED_STREAMS_PER_CONNECTION
+        return [streams[i:i + batch] for i in range(0, len(streams), batch)]
+
+    async def run(self) -> None:
+        await asyncio.gather(self._scan_loop(), *(self._connection(streams) for streams in self.streams()))
+
+    async def _connection(self, streams: List[str]) -> None:
+        url = "wss://stream.binance.com:9443/stream?streams=" + "/".join(streams)
+        while True:
+            try:
+                async with websockets.connect(url, max_queue=None) as websocket:
+                    async for message in websocket:
+                        self.on_message(message)
+            except Exception as e:
+                print(f"⚠️ Erro WebSocket (scanner): {e}")
+                await asyncio.sleep(5)
+
+    async def _scan_loop(self) -> None:
+        while True:
+            await asyncio.sleep(0.25)
+            if self._scan_pending:
+                await asyncio.sleep(SCAN_DELAY)
+                self._scan_pending = False
+                self.scan()
+
+
+def usdt_symbols(exchange) -> List[str]:
+    """Pares spot USDT ativos da Binance"""
+    exchange.load_markets()
+    return sorted(
+        symbol for symbol, market in exchange.markets.items()
+        if market.get('spot') and market.get('active') and market.get('quote') == 'USDT'
+    )
+
+
+def format_ranking(ranking: List[dict], n: int = 10) -> str:
+    """Ranking formatado para Telegram / terminal"""
+    if not ranking:
+        return "🔭 Nenhum par passou nos filtros nesta barra"
+
+    lines = [f"🔭 Top {min(n, len(ranking))} de {len(ranking)} candidatos:"]
+    for position, item in enumerate(ranking[:n], 1):
+        icon = '🟢' if item['side'] == 'buy' else '🔴'
+        lines.append(
+            f"{position}. {icon} {item['symbol']} RSI {item['rsi']:.1f} | ATR {item['atr_pct'] * 100:.2f}% | "
+            f"Vol. barra ${item['bar_quote_volume']:,.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    import ccxt
+
+    parser = argparse.ArgumentParser(description="Scanner de mercado (todos os pares USDT)")
+    parser.add_argument('--timeframe', default='5m', choices=sorted(TIMEFRAME_MS))
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--alertas', action='store_true', help="Envia o ranking para o Telegram a cada barra")
+    args = parser.parse_args()
+
+    public = ccxt.binance({'enableRateLimit': True})
+    symbols = usdt_symbols(public)
+    scanner = MarketScanner(symbols, args.timeframe)
+    print(f"🔭 Escaneando {len(symbols)} pares USDT ({args.timeframe})")
+    scanner.load_history(public)
+
+    scanner.add_listener(lambda ranking: print(f"\n{format_ranking(ranking, args.top)}\n⏱️ {scanner.scan_ms:.2f} ms"))
+    if args.alertas:
+        import telebot
+        from scalpingv2 import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+
+        telegram_bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+        scanner.add_listener(lambda ranking: ranking and telegram_bot.send_message(TELEGRAM_CHAT_ID, format_ranking(ranking, args.top)))
+
+    try:
+        asyncio.run(scanner.run())
+    except KeyboardInterrupt:
+        print("\n🛑 Scanner encerrado")
+
+
+if __name__ == '__main__':
+    main()
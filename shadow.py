@@ -0,0 +1,215 @@
+"""
+Modo sombra: avalia K variantes da estratégia junto com a estratégia ao vivo, sobre os mesmos indicadores.
+
+- Ao vivo, as entradas são avaliadas a cada atualização do stream de kline (`on_indicators`), com os mesmos
+  indicadores que o `get_indicators` do bot calcula (mesma janela, vela em formação incluída), sem REST; a cada
+  tick (`on_tick`) só as saídas (TP/SL) são verificadas. As regras e a gestão das posições hipotéticas de todas
+  as variantes são operações numpy sobre vetores de tamanho K, então uma variante a mais custa microssegundos,
+  não outro processo.
+- As execuções seguem o modelo da PaperExchange: entrada e stop a mercado com slippage, TP no preço limite,
+  taxa por execução. O stop fica fixo em `sl_atr` ATRs (sem break-even/trailing do StopManager).
+- O livro só observa: nenhuma variante envia ordens, e ligar o modo sombra não muda o que o bot faz. A variante
+  primária (índice 0 por padrão) é a regra ao vivo RSI + volume e serve de referência para as demais.
+- Sobre velas históricas, `on_bar` sozinho (saídas pela máxima/mínima da vela) transforma o livro num
+  backtest vetorizado de uma grade de parâmetros (ver robustness.py).
+"""
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from paper_exchange import PAPER_FEE_RATE, PAPER_SLIPPAGE
+from scalpingv2 import MIN_VOLUME_THRESHOLD, TAKE_PROFIT_RATIO
+
+
+class Variant:
+    """Parâmetros de uma variante da regra de entrada RSI (+ volume / MACD) e da saída por ATR"""
+    def __init__(self, name: str, rsi_buy: float = 30, rsi_sell: float = 70, min_volume: float = MIN_VOLUME_THRESHOLD,
+                 volume_confirm: bool = True, macd_confirm: bool = False, tp_ratio: float = TAKE_PROFIT_RATIO,
+                 sl_atr: float = 1.0, allow_sell: bool = True):
+        self.name = name
+        self.rsi_buy = rsi_buy
+        self.rsi_sell = rsi_sell
+        self.min_volume = min_volume
+        self.volume_confirm = volume_confirm   # Exige volume > min_volume
+        self.macd_confirm = macd_confirm       # Exige MACD acima (compra) / abaixo (venda) da linha de sinal
+        self.tp_ratio = tp_ratio               # TP a tp_ratio ATRs da entrada
+        self.sl_atr = sl_atr                   # SL a sl_atr ATRs da entrada
+        self.allow_sell = allow_sell
+
+
+DEFAULT_VARIANTS = [
+    Variant('rsi_volume'),                                              # Regra ao vivo
+    Variant('rsi_macd', volume_confirm=False, macd_confirm=True),       # Regra comentada em trade()
+    Variant('rsi_volume_macd', macd_confirm=True),
+    Variant('rsi_25_75', rsi_buy=25, rsi_sell=75),
+    Variant('rsi_volume_tp3', tp_ratio=3.0),
+    Variant('rsi_volume_long', allow_sell=False),
+]
+
+
+class ShadowBook:
+    def __init__(self, variants: List[Variant], initial_balance: float, risk_per_trade: float, primary: int = 0,
+                 fee_rate: float = PAPER_FEE_RATE, slippage: float = PAPER_SLIPPAGE, record_trades: bool = False):
+        self.variants = list(variants)
+        self.names = [variant.name for variant in self.variants]
+        self.primary = primary
+        self.risk_per_trade = risk_per_trade
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+
+        # Parâmetros das variantes como vetores (K,)
+        def column(attribute, dtype=float):
+            return np.array([getattr(variant, attribute) for variant in self.variants], dtype=dtype)
+
+        self.rsi_buy = column('rsi_buy')
+        self.rsi_sell = column('rsi_sell')
+        self.min_volume = column('min_volume')
+        self.volume_confirm = column('volume_confirm', bool)
+        self.macd_confirm = column('macd_confirm', bool)
+        self.tp_ratio = column('tp_ratio')
+        self.sl_atr = column('sl_atr')
+        self.allow_sell = column('allow_sell', bool)
+
+        # Estado das posições hipotéticas (K,)
+        k = len(self.variants)
+        self.direction = np.zeros(k)            # 1 comprado, -1 vendido, 0 sem posição
+        self.entry = np.zeros(k)
+        self.size = np.zeros(k)
+        self.tp = np.zeros(k)
+        self.sl = np.zeros(k)
+        self.balance = np.full(k, float(initial_balance))
+        self.realized = np.zeros(k)
+        self.unrealized = np.zeros(k)
+        self.fees = np.zeros(k)
+        self.trades = np.zeros(k, dtype=np.int64)
+        self.wins = np.zeros(k, dtype=np.int64)
+        self.peak = np.zeros(k)
+        self.max_drawdown = np.zeros(k)
+        self.entry_balance = np.zeros(k)
+
+        # Trades encerrados: (timestamp, índices das variantes, retorno sobre o saldo na entrada)
+        self.trade_log: Optional[list] = [] if record_trades else None
+
+    def on_tick(self, price: float) -> None:
+        """Verifica TP/SL das posições hipotéticas com o preço do tick e as marca a mercado (sem novas entradas)"""
+        self._exits(price, price, price, False, time.time())
+        self._mark(price)
+
+    def on_indicators(self, price: float, indicators: Dict[str, Optional[float]]) -> Optional[str]:
+        """
+        Avalia as entradas de todas as variantes no preço atual, com os indicadores da janela ao vivo.
+        Retorna o sinal da variante primária ('buy', 'sell' ou None).
+        """
+        return self._evaluate(price, indicators)
+
+    def on_bar(self, candle, indicators: Dict[str, Optional[float]]) -> Optional[str]:
+        """
+        Vela fechada (backtest): TP/SL pela máxima/mínima da vela (SL primeiro se ambos foram tocados) e entradas
+        de todas as variantes no fechamento. Retorna o sinal da variante primária ('buy', 'sell' ou None).
+        """
+        timestamp, _, high, low, close, _ = candle
+        self._exits(close, low, high, True, timestamp / 1000)
+        return self._evaluate(close, indicators)
+
+    def _evaluate(self, price: float, indicators: Dict[str, Optional[float]]) -> Optional[str]:
+        rsi, volume, atr = indicators['RSI'], indicators['volume'], indicators['ATR']
+        if rsi is None or volume is None or not atr:
+            self._mark(price)
+            return None
+
+        macd, signal_line = indicators['MACD'], indicators['Signal_Line']
+        volume_ok = ~self.volume_confirm | (volume > self.min_volume)
+        macd_up = macd is not None and signal_line is not None and macd > signal_line
+        macd_down = macd is not None and signal_line is not None and macd < signal_line
+        buy = (rsi < self.rsi_buy) & volume_ok & (~self.macd_confirm | macd_up)
+        sell = (rsi > self.rsi_sell) & volume_ok & (~self.macd_confirm | macd_down) & self.allow_sell & ~buy
+
+        self._entries(price, atr, buy, sell)
+        self._mark(price)
+
+        if buy[self.primary]:
+            return 'buy'
+        if sell[self.primary]:
+            return 'sell'
+        return None
+
+    def _exits(self, price: float, low: float, high: float, stop_at_level: bool, timestamp: float) -> None:
+        d = self.direction
+        hit_sl = ((d > 0) & (low <= self.sl)) | ((d < 0) & (high >= self.sl))
+        hit_tp = (((d > 0) & (high >= self.tp)) | ((d < 0) & (low <= self.tp))) & ~hit_sl
+        closing = hit_tp | hit_sl
+        if not closing.any():
+            return
+
+        # TP é limite (executa no preço da ordem); SL sai a mercado com slippage contra a posição,
+        # a partir do preço atual (tick) ou do nível do stop (vela)
+        stop_price = self.sl if stop_at_level else price
+        exit_price = np.where(hit_tp, self.tp, stop_price * (1 - d * self.slippage))
+        fee = exit_price * self.size * self.fee_rate
+        pnl = np.where(closing, (exit_price - self.entry) * self.size * d - fee, 0.0)
+
+        self.realized += pnl
+        self.balance += pnl
+        self.fees += np.where(closing, fee, 0.0)
+        self.trades += closing
+        self.wins += closing & ((exit_price - self.entry) * d > 0)
+        self.direction = np.where(closing, 0.0, d)
+        self.size = np.where(closing, 0.0, self.size)
+
+        if self.trade_log is not None:
+            closed = np.flatnonzero(closing)
+            returns = self.balance[closed] / self.entry_balance[closed] - 1
+            self.trade_log.append((timestamp, closed, returns))
+
+    def _entries(self, price: float, atr: float, buy: np.ndarray, sell: np.ndarray) -> None:
+        opening = (self.direction == 0) & (buy | sell)
+        if not opening.any():
+            return
+
+        d = np.where(buy, 1.0, -1.0)
+        fill = price * (1 + d * self.slippage)
+        size = np.minimum(self.balance * self.risk_per_trade / (atr * self.sl_atr), self.balance / fill)
+        fee = fill * size * self.fee_rate
+
+        self.entry_balance = np.where(opening, self.balance, self.entry_balance)
+        self.direction = np.where(opening, d, self.direction)
+        self.entry = np.where(opening, fill, self.entry)
+        self.size = np.where(opening, size, self.size)
+        self.tp = np.where(opening, fill + d * atr * self.tp_ratio, self.tp)
+        self.sl = np.where(opening, fill - d * atr * self.sl_atr, self.sl)
+        self.realized -= np.where(opening, fee, 0.0)
+        self.balance -= np.where(opening, fee, 0.0)
+        self.fees += np.where(opening, fee, 0.0)
+
+    def _mark(self, price: float) -> None:
+        self.unrealized = (price - self.entry) * self.size * self.direction
+        equity = self.realized + self.unrealized
+        self.peak = np.maximum(self.peak, equity)
+        self.max_drawdown = np.maximum(self.max_drawdown, self.peak - equity)
+
+    def summary(self) -> List[dict]:
+        """Resultado de cada variante, da maior para a menor PnL total"""
+        rows = [{
+            'name': name,
+            'primary': i == self.primary,
+            'pnl': float(self.realized[i] + self.unrealized[i]),
+            'realized': float(self.realized[i]),
+            'trades': int(self.trades[i]),
+            'win_rate': float(self.wins[i] / self.trades[i]) if self.trades[i] else None,
+            'max_drawdown': float(self.max_drawdown[i]),
+            'fees': float(self.fees[i]),
+            'position': {1: 'buy', -1: 'sell'}.get(int(self.direction[i])),
+        } for i, name in enumerate(self.names)]
+        return sorted(rows, key=lambda row: row['pnl'], reverse=True)
+
+    def format_summary(self) -> str:
+        lines = ["👥 Variantes (modo sombra):"]
+        for row in self.summary():
+            win_rate = f"{row['win_rate'] * 100:.0f}%" if row['win_rate'] is not None else "-"
+            marker = "⭐ " if row['primary'] else ""
+            lines.append(
+                f"{marker}{row['name']}: ${row['pnl']:.2f} | {row['trades']} trades | acerto {win_rate} | "
+                f"DD ${row['max_drawdown']:.2f}{' | ' + row['position'] if row['position'] else ''}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,152 @@
+"""
+Testes da PaperExchange: falha parcial do cancelReplace (STOP_ON_FAILURE) e velas em cache.
+
+Rodar com: python -m pytest -q
+"""
+from unittest import mock
+
+import ccxt
+import pytest
+
+import scalpingv2
+from paper_exchange import PaperExchange
+from scalpingv2 import BinanceWebSocket, TradingBot, cancel_replace_result
+
+SYMBOL = 'XRP/USDT'
+
+
+class StubPublic:
+    """Cliente público falso: metadados de mercado e velas sem rede"""
+    markets = {SYMBOL: {}}
+
+    def __init__(self, candles=None):
+        self.candles = candles if candles is not None else [[0, 1.0, 1.01, 0.99, 1.0, 100.0] for _ in range(120)]
+        self.calls = 0
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        self.calls += 1
+        return [list(c) for c in self.candles]
+
+    def market_id(self, symbol):
+        return symbol.replace('/', '')
+
+    def market(self, symbol):
+        return {'limits': {'cost': {'min': 5}, 'amount': {'min': 0.1}}}
+
+    def amount_to_precision(self, symbol, amount):
+        return f"{amount:.1f}"
+
+    def price_to_precision(self, symbol, price):
+        return f"{price:.4f}"
+
+
+class PaperBot(TradingBot):
+    def setup_exchange(self):
+        self.exchange = self.paper_exchange = PaperExchange({'USDT': self.initial_balance}, public=StubPublic())
+
+    def setup_telegram(self):
+        pass
+
+    def send_telegram_message(self, message):
+        pass
+
+
+def open_stop(exchange: PaperExchange) -> dict:
+    exchange.on_price(SYMBOL, 1.0)
+    exchange.create_order(SYMBOL, 'market', 'buy', 10)
+    return exchange.create_order(SYMBOL, 'STOP_LOSS_LIMIT', 'sell', 10, 0.98, {'stopPrice': 0.99})
+
+
+def cancel_replace(exchange: PaperExchange, order_id: str, stop_price: float) -> dict:
+    return exchange.private_post_order_cancelreplace({
+        'symbol': 'XRPUSDT', 'side': 'SELL', 'type': 'STOP_LOSS_LIMIT', 'cancelReplaceMode': 'STOP_ON_FAILURE',
+        'cancelOrderId': order_id, 'quantity': '10', 'price': str(stop_price * 0.999), 'stopPrice': str(stop_price),
+    })
+
+
+def test_cancel_replace_moves_stop():
+    exchange = PaperExchange({'USDT': 1000.0}, public=StubPublic())
+    stop = open_stop(exchange)
+
+    response = cancel_replace(exchange, stop['id'], 0.995)
+
+    new_id = str(response['newOrderResponse']['orderId'])
+    assert exchange.fetch_order(stop['id'])['status'] == 'canceled'
+    assert [o['id'] for o in exchange.fetch_open_orders(SYMBOL)] == [new_id]
+
+
+def test_cancel_replace_partial_failure_keeps_old_order_canceled():
+    exchange = PaperExchange({'USDT': 1000.0}, public=StubPublic())
+    stop = open_stop(exchange)
+
+    # Stop acima do preço: a nova ordem dispararia na hora e é rejeitada depois do cancelamento
+    with pytest.raises(ccxt.ExchangeError) as error:
+        cancel_replace(exchange, stop['id'], 1.01)
+
+    assert cancel_replace_result(error.value) == {
+        'cancelResult': 'SUCCESS',
+        'newOrderResult': 'FAILURE',
+        'newOrderResponse': {'code': -2010, 'msg': 'PaperExchange: Stop price would trigger immediately.'},
+    }
+    assert exchange.fetch_order(stop['id'])['status'] == 'canceled'
+    assert exchange.fetch_open_orders(SYMBOL) == []
+
+
+def test_cancel_replace_cancel_failure_changes_nothing():
+    exchange = PaperExchange({'USDT': 1000.0}, public=StubPublic())
+    stop = open_stop(exchange)
+    exchange.cancel_order(stop['id'])
+
+    with pytest.raises(ccxt.ExchangeError) as error:
+        cancel_replace(exchange, stop['id'], 0.995)
+
+    result = cancel_replace_result(error.value)
+    assert (result['cancelResult'], result['newOrderResult']) == ('FAILURE', 'NOT_ATTEMPTED')
+    assert exchange.fetch_open_orders(SYMBOL) == []
+
+
+def test_bot_restores_stop_after_partial_failure():
+    ws = BinanceWebSocket('xrpusdt')
+    with mock.patch.object(scalpingv2.time, 'sleep', lambda seconds: None):
+        bot = PaperBot(SYMBOL, 100, ws, risk_per_trade=0.02, simulation_mode=True)
+        ws.price = 1.0
+        for listener in ws.listeners:
+            listener(1.0)
+        bot.place_trade('buy', 1.0, bot.calculate_trade_size(1.0, 0.05), 0.05)
+
+    exchange = bot.exchange
+    old_sl = bot.active_position['sl_order_id']
+
+    # Sobe até armar o break-even e cai abaixo dele antes do SL ser movido na exchange
+    for price in (1.03, 1.06, 0.99):
+        ws.price = price
+        for listener in ws.listeners:
+            listener(price)
+    assert bot.active_position['stop'].pending()
+
+    bot.check_position()
+
+    position = bot.active_position
+    assert position is not None
+    assert exchange.fetch_order(old_sl)['status'] == 'canceled'
+    sl_order = exchange.fetch_order(position['sl_order_id'])
+    assert sl_order['status'] == 'open' and sl_order['type'] == 'STOP_LOSS_LIMIT'
+    assert sl_order['stopPrice'] < 0.99
+
+
+def test_tick_after_candle_close_opens_new_candle():
+    now_ms = 1_700_000_000_000
+    period = 5 * 60 * 1000
+    open_ts = now_ms - now_ms % period - period    # Vela anterior, já fechada
+    public = StubPublic([[open_ts, 1.0, 1.01, 0.99, 1.0, 100.0]])
+    exchange = PaperExchange({'USDT': 1000.0}, public=public)
+    exchange.fetch_ohlcv(SYMBOL, '5m')
+
+    with mock.patch.object(PaperExchange, '_now', staticmethod(lambda: now_ms)):
+        exchange.on_price(SYMBOL, 1.2)
+        exchange.on_price(SYMBOL, 0.9)
+
+    candles = exchange.fetch_ohlcv(SYMBOL, '5m')
+    assert candles[0] == [open_ts, 1.0, 1.01, 0.99, 1.0, 100.0]
+    assert candles[1] == [open_ts + period, 1.2, 1.2, 0.9, 0.9, 0.0]
+    assert public.calls == 1